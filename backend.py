@@ -1,98 +1,160 @@
 from dotenv import load_dotenv
 import os
 
+# 1. Setting up Gemini Key for google genai API (and the rest of the config)
+# before importing modules that read the environment.
+load_dotenv("keys.env")
+
 # backend.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 # from google import genai
 # from google.genai import types
+import asyncio
+import contextvars
 import json
-from typing import List, Literal, TypedDict, Optional
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import List, Literal, Optional
+# typing_extensions' TypedDict, so pydantic can build tool schemas from it on Python < 3.12
+from typing_extensions import NotRequired, TypedDict
 from datetime import datetime
-from google.generativeai import GenerativeModel, configure
+from google.generativeai.types import content_types
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage # Import ToolMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.config import get_stream_writer
+from session_store import create_session_store
+from context_window import compact_context
+from calendar_cache import CALENDAR_CACHE_FRESHNESS, EVENT_FIELDS, CalendarEventCache
+from calendar_store import create_calendar_store
+from event_index import event_bounds, format_time, free_gaps, is_busy, merge_intervals, parse_time, slim_event
+from response_cache import ResponseCache, conversation_context, turn_messages
+from intent_router import INTENT_ROUTER_ENABLED, Intent, classify
+import budget
+from tool_registry import registry, to_plain, tool
+from google_clients import calendar_service, gemini_model, refresh_credentials, warm_up
+from resilience import CircuitOpenError, DeadlineExceededError, ResilientCaller, is_retryable, new_deadline
+import fast_json
+import metrics
+from scheduler import BACKGROUND_JOBS_ENABLED, BackgroundScheduler
+from metrics import span, timed_node
 
-# 1. Setting up Gemini Key for google genai API
-load_dotenv("keys.env")
+# LOG_LEVEL=DEBUG turns on per-node timing spans, raw Gemini parts and
+# full-state dumps; keep it at INFO (the default) in production.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("backend")
 
-configure(api_key=os.getenv("GEMIN_KEY"))
-# client = genai.Client(api_key=os.getenv("GEMIN_KEY"))
+# Google credentials, the Calendar service and the Gemini model are created
+# lazily by google_clients, so importing this module does no network I/O and
+# never starts the interactive OAuth flow.
 # --- Define Your Tools (Python Functions) ---
 
 
-# This function simulates fetching calendar events
-# In a real app, this would use the Google Calendar API
-
-
 import datetime
 import os.path
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import httplib2
 from googleapiclient.errors import HttpError
 
 
-# If modifying these scopes, delete the file token.json.
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
-creds = None
-# The file token.json stores the user's access and refresh tokens, and is
-# created automatically when the authorization flow completes for the first
-# time.
-if os.path.exists("token.json"):
-  creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-# If there are no (valid) credentials available, let the user log in.
-if not creds or not creds.valid:
-  if creds and creds.expired and creds.refresh_token:
-    creds.refresh(Request())
-  else:
-    flow = InstalledAppFlow.from_client_secrets_file(
-        "credentials.json", SCOPES
-    )
-    creds = flow.run_local_server(port=0)
-  # Save the credentials for the next run
-  with open("token.json", "w") as token:
-    token.write(creds.to_json())
-try:
-    service = build("calendar", "v3", credentials=creds)
-except Exception as e:
-    print(f"An error occurred: {e}")
-    service = None
+# Reads go through this cache; add/delete keep it up to date. With the default
+# CALENDAR_CACHE_STORE=sqlite it is shared by all workers on the host.
+calendar_cache = CalendarEventCache(calendar_service, store=create_calendar_store())
+metrics.registry.counter(
+    "calendar_cache_lookups_total", "Event cache lookups served from cached windows (hit) or fetched (miss).", ("result",),
+    function=lambda: {("hit",): calendar_cache.hits, ("miss",): calendar_cache.misses},
+)
+metrics.registry.gauge(
+    "calendar_cache_hit_ratio", "Share of event cache lookups served from cached windows.",
+    function=lambda: calendar_cache.hits / max(calendar_cache.hits + calendar_cache.misses, 1),
+)
 
 
-def add_calendar_event(summary: str, start_datetime: str, end_datetime: str, location: Optional[str] = None, attendees: Optional[list] = None) -> str:
+def _event_body(summary: str, start_datetime: str, end_datetime: str, location: Optional[str] = None, attendees: Optional[list] = None) -> dict:
+    event_body = {
+        'summary': summary,
+        'start': {'dateTime': start_datetime, 'timeZone': 'UTC'},
+        'end': {'dateTime': end_datetime, 'timeZone': 'UTC'},
+    }
+    if location:
+        event_body['location'] = location
+    if attendees:
+        event_body['attendees'] = [{'email': email} for email in attendees]
+    return event_body
+
+
+def _conflicting_events(start_datetime: str, end_datetime: str) -> list:
+    """
+    Busy events of the primary calendar overlapping the range, from the event cache.
+    """
+    lo, hi = parse_time(start_datetime), parse_time(end_datetime)
+    events = calendar_cache.list_events('primary', format_time(lo), format_time(hi))
+    return [e for e in events if is_busy(e) and event_bounds(e)[0] < hi and event_bounds(e)[1] > lo]
+
+
+def _attendee_busy(time_min: str, time_max: str, attendees: list) -> tuple:
+    """
+    Busy intervals of other people's calendars from the freeBusy API.
+    Returns:
+        ({email: [(start, end), ...]}, [emails whose calendars couldn't be read])
     """
-    Adds a new event to Google Calendar.
+    body = {"timeMin": time_min, "timeMax": time_max, "items": [{"id": email} for email in attendees]}
+    response = metrics.execute(calendar_service().freebusy().query(body=body), "freebusy.query")
+    busy, unavailable = {}, []
+    for email, calendar in response.get("calendars", {}).items():
+        if calendar.get("errors"):
+            unavailable.append(email)
+            continue
+        busy[email] = [(parse_time(b["start"]), parse_time(b["end"])) for b in calendar.get("busy", [])]
+    return busy, unavailable
+
+
+@tool
+def add_calendar_event(summary: str, start_datetime: str, end_datetime: str, location: Optional[str] = None, attendees: Optional[list] = None, allow_conflicts: bool = False) -> str:
+    """
+    Adds a new event to Google Calendar. Refuses when it overlaps an existing
+    event unless allow_conflicts is true; ask the user before overriding.
     Args:
         summary: Event title.
         start_datetime: ISO datetime string (e.g., 2025-07-03T14:00:00).
         end_datetime: ISO datetime string.
         location: Optional location.
         attendees: Optional list of attendee emails.
+        allow_conflicts: Book even if the time overlaps existing events.
     Returns:
-        JSON string with success or error info.
+        JSON string with success, conflict or error info.
     """
     try:
-        event_body = {
-            'summary': summary,
-            'start': {'dateTime': start_datetime, 'timeZone': 'UTC'},
-            'end': {'dateTime': end_datetime, 'timeZone': 'UTC'},
-        }
-        if location:
-            event_body['location'] = location
-        if attendees:
-            event_body['attendees'] = [{'email': email} for email in attendees]
-
-        event = service.events().insert(calendarId='primary', body=event_body).execute()
-        return json.dumps({"status": "success", "event_id": event['id'], "message": "Event created successfully."})
+        if not allow_conflicts:
+            conflicts = _conflicting_events(start_datetime, end_datetime)
+            if conflicts:
+                return fast_json.dumps({
+                    "status": "conflict",
+                    "conflicts": [slim_event(e) for e in conflicts],
+                    "message": f"The time overlaps {len(conflicts)} existing event(s); nothing was booked. Call again with allow_conflicts=true to book anyway.",
+                })
+        event_body = _event_body(summary, start_datetime, end_datetime, location, attendees)
+        event = metrics.execute(calendar_service().events().insert(calendarId='primary', body=event_body, fields=EVENT_FIELDS), "events.insert")
+        calendar_cache.record_insert(event)
+        return fast_json.dumps({"status": "success", "event_id": event['id'], "message": "Event created successfully."})
     except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)})
+        return fast_json.dumps({"status": "error", "message": str(e)})
+
 
+# Most events get_calendar_events returns at once; the rest are paged with `cursor`.
+EVENTS_MAX_RESULTS = int(os.getenv("EVENTS_MAX_RESULTS", "50"))
 
-def get_calendar_events(start_date: Optional[str] = None, end_date: Optional[str] = None, summary_keyword: Optional[str] = None, attendee_email: Optional[str] = None) -> str:
+
+@tool(cacheable=True)
+def get_calendar_events(start_date: Optional[str] = None, end_date: Optional[str] = None, summary_keyword: Optional[str] = None, attendee_email: Optional[str] = None, max_results: int = EVENTS_MAX_RESULTS, cursor: Optional[str] = None) -> str:
     """
     Fetches events from Google Calendar.
     Use it to search for events based on date range, summary keyword, or attendee email to delete or modify t
@@ -101,37 +163,34 @@ def get_calendar_events(start_date: Optional[str] = None, end_date: Optional[str
         end_date: YYYY-MM-DD (end filter). (optional)
         summary_keyword: Filter by keyword in summary. (optional)
         attendee_email: Filter by attendee email. (optional)
+        max_results: Most events to return. (optional)
+        cursor: next_cursor from a previous call with the same filters, to get more. (optional)
     Returns:
-        JSON string with events or error info.
+        JSON string with events (id, summary, start, end, location, attendees)
+        or error info; "next_cursor" is set when more events are available.
     """
     try:
         time_min = f"{start_date}T00:00:00Z" if start_date else None
         time_max = f"{end_date}T23:59:59Z" if end_date else None
 
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=time_min,
-            timeMax=time_max,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-
-        events = events_result.get('items', [])
-        filtered_events = []
-        for event in events:
-            match = True
-            if summary_keyword and summary_keyword.lower() not in event.get('summary', '').lower():
-                match = False
-            if attendee_email and attendee_email.lower() not in [a['email'].lower() for a in event.get('attendees', [])]:
-                match = False
-            if match:
-                filtered_events.append(event)
-        print(f"Found {len(filtered_events)} events matching criteria.")
-        return json.dumps({"events": filtered_events})
+        # Served from the local cache; only missing windows and changes since
+        # the last sync token go over the network. Keyword and attendee filters
+        # are resolved by the cache's event index.
+        filtered_events = calendar_cache.list_events('primary', time_min, time_max, summary_keyword, attendee_email)
+        logger.debug("Found %d events matching criteria.", len(filtered_events))
+        # The cursor is an offset into the filtered, start-ordered results.
+        offset = int(cursor) if cursor else 0
+        limit = max(1, min(max_results, EVENTS_MAX_RESULTS))
+        page = filtered_events[offset:offset + limit]
+        result = {"events": [slim_event(e) for e in page], "total": len(filtered_events)}
+        if offset + limit < len(filtered_events):
+            result["next_cursor"] = str(offset + limit)
+        return fast_json.dumps(result)
     except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)})
+        return fast_json.dumps({"status": "error", "message": str(e)})
 
 
+@tool
 def delete_calendar_event(event_id: str) -> str:
     """
     Deletes an event from Google Calendar by ID.
@@ -141,13 +200,246 @@ def delete_calendar_event(event_id: str) -> str:
         JSON string with success or error info.
     """
     try:
-        service.events().delete(calendarId='primary', eventId=event_id).execute()
-        return json.dumps({"status": "success", "message": f"Event {event_id} deleted successfully."})
+        metrics.execute(calendar_service().events().delete(calendarId='primary', eventId=event_id), "events.delete")
+        calendar_cache.record_delete(event_id)
+        return fast_json.dumps({"status": "success", "message": f"Event {event_id} deleted successfully."})
     except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)})
+        return fast_json.dumps({"status": "error", "message": str(e)})
 
 
-from datetime import datetime
+@tool
+def check_conflicts(start_datetime: str, end_datetime: str, attendees: Optional[list] = None) -> str:
+    """
+    Checks whether a time range is free: lists your events overlapping it
+    and which attendees are busy then. Prefer this over get_calendar_events
+    for "am I free at ...?" questions.
+    Args:
+        start_datetime: ISO datetime string (e.g., 2025-07-03T14:00:00).
+        end_datetime: ISO datetime string.
+        attendees: Optional list of other people's emails to check as well.
+    Returns:
+        JSON string with "free", the conflicting events and busy attendees, or error info.
+    """
+    try:
+        lo, hi = parse_time(start_datetime), parse_time(end_datetime)
+        conflicts = _conflicting_events(start_datetime, end_datetime)
+        busy_attendees, unavailable = [], []
+        if attendees:
+            busy, unavailable = _attendee_busy(format_time(lo), format_time(hi), attendees)
+            busy_attendees = [email for email, intervals in busy.items() if any(b_lo < hi and b_hi > lo for b_lo, b_hi in intervals)]
+        result = {
+            "status": "success",
+            "free": not conflicts and not busy_attendees,
+            "conflicts": [slim_event(e) for e in conflicts],
+            "busy_attendees": busy_attendees,
+        }
+        if unavailable:
+            result["unavailable_attendees"] = unavailable
+        return fast_json.dumps(result)
+    except Exception as e:
+        return fast_json.dumps({"status": "error", "message": str(e)})
+
+
+FREE_SLOTS_MAX = 10
+
+
+@tool
+def find_free_slots(start_datetime: str, end_datetime: str, duration_minutes: int = 30, attendees: Optional[list] = None) -> str:
+    """
+    Finds free time in a range, for you and optionally other attendees.
+    Prefer this over get_calendar_events for "when am I free?" or
+    "find a slot with ..." questions.
+    Args:
+        start_datetime: ISO datetime string where the search starts (e.g., 2025-07-03T12:00:00).
+        end_datetime: ISO datetime string where it ends.
+        duration_minutes: Shortest useful slot, in minutes.
+        attendees: Optional list of other people's emails who must be free too.
+    Returns:
+        JSON string with the free slots (earliest first) or error info.
+    """
+    try:
+        lo, hi = parse_time(start_datetime), parse_time(end_datetime)
+        intervals = [event_bounds(e) for e in _conflicting_events(start_datetime, end_datetime)]
+        unavailable = []
+        if attendees:
+            busy, unavailable = _attendee_busy(format_time(lo), format_time(hi), attendees)
+            for attendee_intervals in busy.values():
+                intervals.extend(attendee_intervals)
+        gaps = free_gaps(merge_intervals(intervals), lo, hi, duration_minutes * 60)
+        result = {
+            "status": "success",
+            "slots": [{"start": format_time(g_lo), "end": format_time(g_hi)} for g_lo, g_hi in gaps[:FREE_SLOTS_MAX]],
+        }
+        if len(gaps) > FREE_SLOTS_MAX:
+            result["more_slots"] = len(gaps) - FREE_SLOTS_MAX
+        if unavailable:
+            result["unavailable_attendees"] = unavailable
+        return fast_json.dumps(result)
+    except Exception as e:
+        return fast_json.dumps({"status": "error", "message": str(e)})
+
+
+# --- Bulk mutations through the Google API batch endpoint ---
+BATCH_SIZE = 50  # Calendar API limit per batch request
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", "3"))
+BATCH_RETRY_DELAY = float(os.getenv("BATCH_RETRY_DELAY", "0.5"))
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _is_retryable_http_error(error: Exception) -> bool:
+    if isinstance(error, (OSError, httplib2.HttpLib2Error)):
+        return True  # the batch round-trip itself failed (timeout, reset connection)
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    return status in _RETRYABLE_STATUSES or (status == 403 and "rate limit" in str(error).lower())
+
+
+def _execute_batch(make_requests: dict, done_on_retry: tuple = ()) -> dict:
+    """
+    Sends requests through the batch endpoint, BATCH_SIZE per HTTP round-trip,
+    retrying only the items that failed with a retryable error. A failed
+    round-trip fails only its own chunk's items. Requests may be sent again
+    after a 5xx, so they must be idempotent (see add_calendar_events).
+    Args:
+        make_requests: key -> zero-argument function building the API request
+            (a request can't be re-added to a batch, so retries rebuild it).
+        done_on_retry: HTTP statuses that, in answer to a resent request,
+            mean an earlier attempt already succeeded (e.g. 404/410 for a delete).
+    Returns:
+        key -> (response, error); error is None on success.
+    """
+    service = calendar_service()
+    results = {}
+    pending = list(make_requests)
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        if attempt:
+            # Exponential backoff before resending the failed items.
+            time.sleep(BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+        def callback(request_id, response, exception):
+            if attempt and isinstance(exception, HttpError) and exception.resp.status in done_on_retry:
+                response, exception = None, None
+            results[int(request_id)] = (response, exception)
+        for i in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[i:i + BATCH_SIZE]
+            for key in chunk:
+                results.pop(key, None)
+            batch = service.new_batch_http_request(callback=callback)
+            for key in chunk:
+                batch.add(make_requests[key](), request_id=str(key))
+            try:
+                metrics.execute(batch, "batch")
+            except Exception as e:
+                # Earlier chunks' results stand; this chunk's unanswered items get the error.
+                for key in chunk:
+                    results.setdefault(key, (None, e))
+        pending = [key for key in pending if results[key][1] is not None and _is_retryable_http_error(results[key][1])]
+        if not pending:
+            break
+    return results
+
+
+def _batch_status(results: dict) -> str:
+    failures = sum(1 for _, error in results.values() if error is not None)
+    if failures == 0:
+        return "success"
+    return "error" if failures == len(results) else "partial"
+
+
+class NewEvent(TypedDict):
+    summary: str
+    start_datetime: str
+    end_datetime: str
+    location: NotRequired[str]
+    attendees: NotRequired[List[str]]
+
+
+@tool
+def add_calendar_events(events: List[NewEvent]) -> str:
+    """
+    Adds several events to Google Calendar in one batch. Prefer this over
+    repeated add_calendar_event calls when creating more than one event.
+    Args:
+        events: Events to create, each with summary, start_datetime and
+            end_datetime (ISO datetime strings) and optional location and
+            attendees (list of emails).
+    Returns:
+        JSON string with an overall status and a per-event result list.
+    """
+    try:
+        bodies = [
+            _event_body(e['summary'], e['start_datetime'], e['end_datetime'], e.get('location'), e.get('attendees'))
+            for e in events
+        ]
+        # Client-chosen ids (uuid4 hex is valid base32hex) make retried inserts
+        # idempotent: a 5xx doesn't mean the event wasn't created, and sending
+        # it again then fails with 409 instead of creating a duplicate.
+        for body in bodies:
+            body['id'] = uuid.uuid4().hex
+        results = _execute_batch({
+            i: (lambda body=body: calendar_service().events().insert(calendarId='primary', body=body, fields=EVENT_FIELDS))
+            for i, body in enumerate(bodies)
+        })
+        # With random ids a 409 can only come from an earlier attempt of ours.
+        duplicates = [i for i, (_, error) in results.items() if isinstance(error, HttpError) and error.resp.status == 409]
+        if duplicates:
+            fetched = _execute_batch({
+                i: (lambda event_id=bodies[i]['id']: calendar_service().events().get(calendarId='primary', eventId=event_id, fields=EVENT_FIELDS))
+                for i in duplicates
+            })
+            results.update({i: result for i, result in fetched.items() if result[1] is None})
+        items = []
+        for i in range(len(bodies)):
+            event, error = results[i]
+            if error is None:
+                calendar_cache.record_insert(event)
+                items.append({"index": i, "status": "success", "event_id": event['id']})
+            else:
+                items.append({"index": i, "status": "error", "message": str(error)})
+        created = sum(1 for item in items if item["status"] == "success")
+        return fast_json.dumps({"status": _batch_status(results), "results": items, "message": f"Created {created} of {len(bodies)} events."})
+    except Exception as e:
+        return fast_json.dumps({"status": "error", "message": str(e)})
+
+
+@tool
+def delete_calendar_events(event_ids: List[str]) -> str:
+    """
+    Deletes several events from Google Calendar in one batch. Prefer this over
+    repeated delete_calendar_event calls when removing more than one event.
+    Args:
+        event_ids: The events' unique IDs.
+    Returns:
+        JSON string with an overall status and a per-event result list.
+    """
+    try:
+        results = _execute_batch({
+            i: (lambda event_id=event_id: calendar_service().events().delete(calendarId='primary', eventId=event_id))
+            for i, event_id in enumerate(event_ids)
+        }, done_on_retry=(404, 410))  # a delete that failed with a 5xx may still have gone through
+        items = []
+        for i, event_id in enumerate(event_ids):
+            _, error = results[i]
+            if error is None:
+                calendar_cache.record_delete(event_id)
+                items.append({"index": i, "status": "success", "event_id": event_id})
+            else:
+                items.append({"index": i, "status": "error", "event_id": event_id, "message": str(error)})
+        deleted = sum(1 for item in items if item["status"] == "success")
+        return fast_json.dumps({"status": _batch_status(results), "results": items, "message": f"Deleted {deleted} of {len(event_ids)} events."})
+    except Exception as e:
+        return fast_json.dumps({"status": "error", "message": str(e)})
+
+
+from datetime import datetime, timedelta
+
+
+def _now() -> datetime:
+    # The clock behind get_current_datetime, also used to date response cache keys.
+    return datetime.now()
+
+
+@tool
 def get_current_datetime() -> str:
     """
     Gets the current date and time in the specified format.
@@ -158,16 +450,11 @@ def get_current_datetime() -> str:
     """
     
     try:
-        return json.dumps({"status": "success", "message": f"Today's date and time is {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"})
+        return fast_json.dumps({"status": "success", "message": f"Today's date and time is {_now().strftime('%Y-%m-%d %H:%M:%S')}"})
     except Exception as e:
-        return json.dumps({"status": "error", "message": str(e)})
+        return fast_json.dumps({"status": "error", "message": str(e)})
 
 
-tools = [get_calendar_events,
-        delete_calendar_event,
-        add_calendar_event,
-        get_current_datetime
-    ]
 
 
 
@@ -175,185 +462,726 @@ tools = [get_calendar_events,
 # --- LangGraph State Definition ---
 class ChatState(TypedDict):
     messages: List[HumanMessage | AIMessage | ToolMessage] # Added ToolMessage
+    summary: str  # running summary of turns dropped by manage_context
+    context_epoch: int  # bumped every time manage_context rewrites the history
 
 # --- LangGraph Node Functions ---
 
-def call_gemini(state: ChatState) -> dict:
+def _to_gemini_message(msg) -> Optional[dict]:
+    """
+    Converts one LangChain message to Gemini's expected format for `contents`.
+    """
+    if isinstance(msg, HumanMessage):
+        return {"role": "user", "parts": [{"text": msg.content}]}
+
+    elif isinstance(msg, AIMessage) and msg.tool_calls:
+        # exactly one branch for tool calls
+        return {
+            "role": "model",
+            "parts": [
+                {"function_call": {"name": tc["name"], "args": tc["args"]}}
+                for tc in msg.tool_calls
+            ]
+        }
+
+    elif isinstance(msg, AIMessage):
+        return {"role": "model", "parts": [{"text": msg.content}]}
+
+    elif isinstance(msg, ToolMessage):
+        return {
+            "role": "model",
+            "parts": [{
+                "function_response": {
+                    "name": msg.name,
+                    "response": fast_json.loads(msg.content)
+                }
+            }]
+        }
+    return None
+
+
+class GeminiTranscript:
+    """
+    Gemini `contents` for one conversation, kept in sync with the LangChain
+    message list by converting only the messages appended since the last call.
+    Entries are already protos.Content, so start_chat doesn't re-convert them.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, summary: str = "", epoch: int = 0) -> None:
+        self.contents = []
+        self.converted = 0  # number of LangChain messages already in contents
+        self.first_message = None
+        self.last_message = None
+        self.last_was_tool = False
+        self.epoch = epoch
+        if summary:
+            self.contents.append(content_types.to_content(
+                {"role": "user", "parts": [{"text": f"Summary of the earlier conversation:\n{summary}"}]}
+            ))
+
+    def _is_prefix_of(self, messages: list) -> bool:
+        n = self.converted
+        if n == 0:
+            return True
+        if n > len(messages):
+            return False
+        # Identity is the cheap path (in-memory sessions); equality covers
+        # messages that were re-created, e.g. loaded back from SQLite.
+        first, last = messages[0], messages[n - 1]
+        return (first is self.first_message or first == self.first_message) and \
+            (last is self.last_message or last == self.last_message)
+
+    def sync(self, messages: list, summary: str = "", epoch: int = 0) -> list:
+        """
+        Brings the transcript up to date with messages and returns its contents.
+        Args:
+            messages: The conversation's LangChain messages.
+            summary: Running summary, sent ahead of the messages.
+            epoch: ChatState context_epoch; a change means the history was
+                rewritten by manage_context and must be converted again.
+        """
+        if epoch != self.epoch or self.converted == 0 or not self._is_prefix_of(messages):
+            self.reset(summary, epoch)
+            metrics.transcript_syncs.inc(result="miss")
+        else:
+            metrics.transcript_syncs.inc(result="hit")
+        for msg in messages[self.converted:]:
+            gemini_message = _to_gemini_message(msg)
+            if gemini_message is None:
+                continue
+            content = content_types.to_content(gemini_message)
+            is_tool = isinstance(msg, ToolMessage)
+            if is_tool and self.last_was_tool:
+                # All results of one parallel tool step go back to Gemini as one turn.
+                self.contents[-1].parts.extend(content.parts)
+            else:
+                self.contents.append(content)
+            self.last_was_tool = is_tool
+        if messages:
+            self.first_message = messages[0]
+            self.last_message = messages[-1]
+        self.converted = len(messages)
+        return self.contents
+
+
+# Per-session transcripts, least recently used first.
+TRANSCRIPT_CACHE_SIZE = int(os.getenv("TRANSCRIPT_CACHE_SIZE", "1000"))
+_transcripts = OrderedDict()
+_transcripts_lock = threading.Lock()
+
+
+def _get_transcript(config: Optional[RunnableConfig]) -> GeminiTranscript:
+    """
+    Returns the cached transcript for the run's configurable["session_id"],
+    or a throwaway one when the graph is invoked without a session.
+    """
+    session_id = ((config or {}).get("configurable") or {}).get("session_id")
+    if session_id is None:
+        return GeminiTranscript()
+    with _transcripts_lock:
+        transcript = _transcripts.get(session_id)
+        if transcript is None:
+            transcript = _transcripts[session_id] = GeminiTranscript()
+            while len(_transcripts) > TRANSCRIPT_CACHE_SIZE:
+                _transcripts.popitem(last=False)
+        else:
+            _transcripts.move_to_end(session_id)
+        return transcript
+
+
+def _start_gemini_chat(contents: list):
+    """
+    Opens a Gemini chat primed with everything but the last message.
+    Returns:
+        (chat, parts of the last message to send)
+    """
+    # One shared model, built on first use from the registry's cached tool declarations.
+    chat = gemini_model().start_chat(history=contents[:-1])
+    return chat, contents[-1].parts
+
+
+def _gemini_update(state: ChatState, response) -> dict:
+    """
+    Turns a Gemini response into the state update for the graph.
+    """
+    gemini_response_parts = response.parts
+    logger.debug("Gemini raw response parts: %s", gemini_response_parts)
+    usage = getattr(response, "usage_metadata", None)
+    usage_metadata = None
+    if usage is not None:
+        metrics.gemini_tokens.inc(usage.prompt_token_count, kind="prompt")
+        metrics.gemini_tokens.inc(usage.candidates_token_count, kind="response")
+        # Kept on the message so the turn's token budget can be checked.
+        usage_metadata = {
+            "input_tokens": usage.prompt_token_count,
+            "output_tokens": usage.candidates_token_count,
+            "total_tokens": usage.prompt_token_count + usage.candidates_token_count,
+        }
+    # Gemini may ask for several tools in one response; keep all of them.
+    function_calls = [p.function_call for p in gemini_response_parts if p.function_call]
+    if function_calls:
+        return {"messages": state["messages"] + [
+            AIMessage(
+                content="",
+                # Proto args (MapComposite/RepeatedComposite) as plain values,
+                # so the session store can serialize them.
+                tool_calls=[
+                    {"id": fc.id or f"tool_call_{i}", "name": fc.name, "args": to_plain(fc.args)}
+                    for i, fc in enumerate(function_calls)
+                ],
+                usage_metadata=usage_metadata,
+            )
+        ]}
+    else:
+        return {"messages": state["messages"] + [AIMessage(content=response.text, usage_metadata=usage_metadata)]}
+
+
+def _gemini_error(state: ChatState, e: Exception) -> dict:
+    """
+    Ends the turn with an apology instead of an exception, once retries are
+    exhausted; the next user message starts over.
+    """
+    logger.warning("Error calling Gemini: %s: %s", type(e).__name__, e)
+    if isinstance(e, CircuitOpenError):
+        content = "The assistant is temporarily unavailable. Please try again in a minute."
+    elif isinstance(e, DeadlineExceededError):
+        # Report what the turn's tools already did rather than just giving up.
+        return _partial_turn(state, "deadline")
+    else:
+        content = f"Error: {e}. Please try again."
+    return {"messages": state["messages"] + [AIMessage(content=content)]}
+
+
+# Retries with backoff, circuit breaker and concurrency limit for every Gemini call.
+gemini_caller = ResilientCaller()
+
+
+def _deadline(config: Optional[RunnableConfig]) -> Optional[float]:
+    # Set by the endpoints (time.monotonic() based); ResilientCaller defaults it otherwise.
+    return ((config or {}).get("configurable") or {}).get("deadline")
+
+
+@timed_node("call_gemini")
+def call_gemini(state: ChatState, config: RunnableConfig) -> dict:
     """
     Calls the Gemini API, potentially using tools.
     """
-    print("--- Node: call_gemini ---")
-    current_messages = state["messages"]
+    contents = _get_transcript(config).sync(state["messages"], state.get("summary", ""), state.get("context_epoch", 0))
 
+    def send(timeout: float):
+        # A fresh chat per attempt, so a failed attempt leaves nothing behind.
+        chat, parts = _start_gemini_chat(contents)
+        return chat.send_message(parts, request_options={"timeout": timeout})
 
-    # Convert LangChain messages to Gemini's expected format for `contents`
-    gemini_messages = []
-    for msg in current_messages:
-        if isinstance(msg, HumanMessage):
-            gemini_messages.append({"role": "user", "parts": [{"text": msg.content}]})
-    
-        elif isinstance(msg, AIMessage) and msg.tool_calls:
-            # exactly one branch for tool calls
-            gemini_messages.append({
-                "role": "model",
-                "parts": [
-                    {"function_call": {"name": tc["name"], "args": tc["args"]}}
-                    for tc in msg.tool_calls
-                ]
-            })
-    
-        elif isinstance(msg, AIMessage):
-            gemini_messages.append({"role": "model", "parts": [{"text": msg.content}]})
-    
-        elif isinstance(msg, ToolMessage):
-            gemini_messages.append({
-                "role": "model",
-                "parts": [{
-                    "function_response": {
-                        "name": msg.name,
-                        "response": json.loads(msg.content)
-                    }
-                }]
-            })
+    try:
+        response = gemini_caller.call(send, _deadline(config))
+        return _gemini_update(state, response)
+    except Exception as e:
+        return _gemini_error(state, e)
+
+
+@timed_node("call_gemini")
+async def acall_gemini(state: ChatState, config: RunnableConfig) -> dict:
+    """
+    Async version of call_gemini: awaits Gemini instead of blocking the event loop.
+    With configurable["stream_tokens"] set, Gemini's streaming API is used and
+    each text chunk is emitted as a "token" custom stream event.
+    """
+    contents = _get_transcript(config).sync(state["messages"], state.get("summary", ""), state.get("context_epoch", 0))
+    stream_tokens = config.get("configurable", {}).get("stream_tokens")
+    streamed = False
+
+    async def send(timeout: float):
+        nonlocal streamed
+        chat, parts = _start_gemini_chat(contents)
+        if not stream_tokens:
+            return await chat.send_message_async(parts, request_options={"timeout": timeout})
+        writer = get_stream_writer()
+        response = await chat.send_message_async(parts, stream=True, request_options={"timeout": timeout})
+        async for chunk in response:
+            for part in chunk.parts:
+                if part.text:
+                    streamed = True
+                    writer({"type": "token", "text": part.text})
+        return response
 
-            # gemini_messages.append({
-            #         "role": "model",
-            #         "parts": [{
-            #         "function_response": {
-            #             "name": msg.name,
-            #             "response": json.loads(msg.content) if isinstance(msg.content, str) else msg.content
-            #         }
-            #     }]
-            # })
-    # x=1
-    # while x: 
     try:
-        model = GenerativeModel("gemini-2.5-flash", tools=tools)
-        # chat = model.start_chat(history=gemini_messages[:-1])
-        # Convert any LangChain messages to Gemini's expected dict format
-        history_dicts = [
-            {
-                "role": m["role"],
-                "parts": [
-                    {"text": p.text} if hasattr(p, "text") else p
-                    for p in m["parts"]
-                ],
-            }
-            for m in gemini_messages[:-1]
-        ]
-        chat = model.start_chat(history=history_dicts)
-        response = chat.send_message(gemini_messages[-1]["parts"])
-        gemini_response_parts = response.parts
-        print("Gemini Raw Response Parts:", gemini_response_parts)
-        if gemini_response_parts and gemini_response_parts[0].function_call:
-            fc = gemini_response_parts[0].function_call
-            return {"messages": state["messages"] + [
-                AIMessage(
-                    content="",
-                    tool_calls=[{"id": fc.id, "name": fc.name, "args": fc.args}]
-                )
-            ]}
-        else:
-            return {"messages": state["messages"] + [AIMessage(content=response.text)]}
+        # Once tokens have reached the client, a retry would repeat them.
+        response = await gemini_caller.acall(send, _deadline(config), retryable=lambda e: not streamed and is_retryable(e))
+        return _gemini_update(state, response)
     except Exception as e:
-        print(f"Error calling Gemini: {e}")
-        x=int(input("Press 1 to continue or 0 to stop: "))
-        print(chat)
-        # print(response)
-        # print(gemini_response_parts)
-        # if(x==0):
-        return {"messages": state["messages"] + [AIMessage(content=f"Error: {e}. Please try again.")]}
+        return _gemini_error(state, e)
+
+
+# Bounded pool shared by all requests for running tool calls; the Calendar
+# client is blocking, so parallel calls need threads.
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+
+
+def _run_tool(tool_call: dict) -> ToolMessage:
+    """
+    Runs one tool call and wraps its result in a ToolMessage.
+    """
+    tool_name = tool_call["name"]
+    tool_args = tool_call["args"]
+    writer = get_stream_writer()
+    writer({"type": "tool_start", "name": tool_name})
+    # Unknown tools and bad arguments come back as an error result without
+    # the tool being called. Calendar API calls made inside are labelled with the tool.
+    token = metrics.current_tool.set(tool_name)
+    try:
+        with span("tool", tool=tool_name):
+            tool_result = registry.dispatch(tool_name, tool_args)
+    finally:
+        metrics.current_tool.reset(token)
+    writer({"type": "tool_end", "name": tool_name, "status": fast_json.loads(tool_result).get("status", "success")})
+    logger.debug("Tool call: %s", tool_call)
+    return ToolMessage(
+        name=tool_name,
+        content=tool_result,
+        tool_call_id=tool_call.get("id", "tool_call_0")
+    )
+
+
+def _submit_tool(tool_call: dict) -> Future:
+    # Each call runs in a copy of the graph's context so get_stream_writer()
+    # works on the pool thread.
+    return _tool_executor.submit(contextvars.copy_context().run, _run_tool, tool_call)
+
+
+def _timed_out_tool(tool_call: dict) -> ToolMessage:
+    # The call keeps running on the pool; the turn just stops waiting for it.
+    return ToolMessage(
+        name=tool_call["name"],
+        content=fast_json.dumps({"status": "error", "message": "Timed out at the request deadline; the operation may still complete."}),
+        tool_call_id=tool_call.get("id", "tool_call_0"),
+    )
 
 
-def execute_tool(state: ChatState) -> dict:
+@timed_node("execute_tool")
+def execute_tool(state: ChatState, config: Optional[RunnableConfig] = None) -> dict:
     """
-    Executes the tool call requested by Gemini.
+    Executes the tool calls requested by Gemini, concurrently when there are
+    several, and returns all their ToolMessages in one step. Calls still
+    running at the request deadline are reported as timed out.
     """
-    print("--- Node: execute_tool ---")
     last_message = state["messages"][-1]
 
     if isinstance(last_message, AIMessage) and last_message.tool_calls:
-        # Assuming only one tool call for simplicity; parallel tool calls are possible
-        tool_call = last_message.tool_calls[0]
-        tool_name = tool_call["name"]
-        tool_args = tool_call["args"]
-        
-        # Dynamically call the function based on its name
-        if tool_name == "get_calendar_events":
-            tool_result = get_calendar_events(**tool_args)
-        elif tool_name == "delete_calendar_event":
-            tool_result = delete_calendar_event(**tool_args)
-        elif tool_name == "add_calendar_event":
-            tool_result = add_calendar_event(**tool_args)
-        elif tool_name == "get_current_datetime":
-            tool_result = get_current_datetime(**tool_args)
+        tool_calls = last_message.tool_calls
+        deadline = _deadline(config)
+        if len(tool_calls) == 1 and deadline is None:
+            tool_messages = [_run_tool(tool_calls[0])]
         else:
-            tool_result = json.dumps({"error": f"Unknown tool: {tool_name}"})
-        
-        # Return a ToolMessage with the result. LangGraph will update the state.
-        print("tool call ---> ",tool_call)
-        print("prinnnnttttt ---> ",tool_call.get("id","tool_call_0"))
-        return {"messages": state["messages"] + [
-            ToolMessage(
-                name=tool_name,
-                content=tool_result,
-                tool_call_id=tool_call.get("id", "tool_call_0")
-            )
-        ]}
+            futures = [_submit_tool(tool_call) for tool_call in tool_calls]
+            wait(futures, timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            tool_messages = [
+                future.result() if future.done() else _timed_out_tool(tool_call)
+                for future, tool_call in zip(futures, tool_calls)
+            ]
+        # Return the ToolMessages in call order. LangGraph will update the state.
+        return {"messages": state["messages"] + tool_messages}
     else:
         # This node should only be reached if there's a tool call to execute
-        print("Error: execute_tool called without a valid tool_call in the last message.")
+        logger.error("execute_tool called without a valid tool_call in the last message.")
         return {"messages": state["messages"] + [AIMessage(content="Internal error: No tool call to execute.")]}
 
 
+@timed_node("manage_context")
+def manage_context(state: ChatState) -> dict:
+    """
+    Keeps the prompt under CONTEXT_TOKEN_BUDGET before each new user turn:
+    digests old tool results and folds the oldest turns into state["summary"].
+    """
+    update = compact_context(state["messages"], state.get("summary", ""))
+    if update:
+        logger.info("manage_context: compacted to %d messages", len(update["messages"]))
+        update["context_epoch"] = state.get("context_epoch", 0) + 1
+    return update
+
+
+@timed_node("execute_tool")
+async def aexecute_tool(state: ChatState, config: Optional[RunnableConfig] = None) -> dict:
+    """
+    Async version of execute_tool. The Calendar client is synchronous, so each
+    tool call runs on the tool pool and the event loop stays free for other chats.
+    """
+    last_message = state["messages"][-1]
+    if not (isinstance(last_message, AIMessage) and last_message.tool_calls):
+        return execute_tool(state)
+    tool_calls = last_message.tool_calls
+    futures = [asyncio.wrap_future(_submit_tool(tool_call)) for tool_call in tool_calls]
+    deadline = _deadline(config)
+    await asyncio.wait(futures, timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+    tool_messages = []
+    for future, tool_call in zip(futures, tool_calls):
+        if future.done():
+            tool_messages.append(future.result())
+        else:
+            future.cancel()  # stops waiting; the pool thread finishes on its own
+            tool_messages.append(_timed_out_tool(tool_call))
+    return {"messages": state["messages"] + tool_messages}
+
+
+def _partial_turn(state: ChatState, reason: str) -> dict:
+    """
+    Ends a turn that ran out of budget with a partial answer. A pending tool
+    call is dropped unexecuted, so the history never holds a call without its result.
+    """
+    logger.warning("Turn stopped: %s budget exhausted", reason)
+    metrics.budget_exhausted.inc(reason=reason)
+    messages = state["messages"]
+    if isinstance(messages[-1], AIMessage) and messages[-1].tool_calls:
+        messages = messages[:-1]
+    return {"messages": messages + [AIMessage(content=budget.partial_answer(messages, reason))]}
+
+
+@timed_node("over_budget")
+def over_budget(state: ChatState, config: RunnableConfig) -> dict:
+    """
+    Graph node reached instead of another tool or model step once the turn's
+    budget is spent.
+    """
+    return _partial_turn(state, budget.exceeded(state["messages"], _deadline(config)) or "deadline")
+
+
+def _after_gemini(state: ChatState, config: RunnableConfig) -> str:
+    last_message = state["messages"][-1]
+    if not (isinstance(last_message, AIMessage) and last_message.tool_calls):
+        return "text_response"
+    return "over_budget" if budget.exceeded(state["messages"], _deadline(config)) else "tool_call"
+
+
+def _after_tools(state: ChatState, config: RunnableConfig) -> str:
+    return "over_budget" if budget.exceeded(state["messages"], _deadline(config)) else "call_gemini"
+
+
+def _route(state: ChatState) -> Optional[Intent]:
+    last_message = state["messages"][-1]
+    intent = classify(last_message.content) if INTENT_ROUTER_ENABLED and isinstance(last_message, HumanMessage) else None
+    if intent is None:
+        metrics.router_requests.inc(intent="none", result="miss")
+    return intent
+
+
+def _routed_reply(state: ChatState, intent: Intent, tool_call: dict, tool_message: ToolMessage, start: float) -> dict:
+    """
+    Ends the turn with the intent's templated reply, recorded in the history
+    as if Gemini had called the tool and answered; or leaves the message to
+    Gemini when the template can't be filled.
+    """
+    reply = intent.render(fast_json.loads(tool_message.content))
+    if reply is None:
+        metrics.router_requests.inc(intent=intent.name, result="miss")
+        return {}
+    metrics.router_requests.inc(intent=intent.name, result="hit")
+    saved = 2 * metrics.node_duration.mean(node="call_gemini") - (time.perf_counter() - start)
+    metrics.router_saved_seconds.inc(max(saved, 0.0))
+    get_stream_writer()({"type": "token", "text": reply})
+    return {"messages": state["messages"] + [AIMessage(content="", tool_calls=[tool_call]), tool_message, AIMessage(content=reply)]}
+
+
+def _routed_tool_call(intent: Intent) -> dict:
+    return {"id": f"route_{intent.name}", "name": intent.tool, "args": intent.make_args(_now())}
+
+
+@timed_node("route_intent")
+def route_intent(state: ChatState) -> dict:
+    """
+    Answers trivial requests (the current time, today's events) by calling the
+    tool directly and filling in a template, without a Gemini round-trip.
+    Anything else is left for call_gemini.
+    """
+    start = time.perf_counter()
+    intent = _route(state)
+    if intent is None:
+        return {}
+    tool_call = _routed_tool_call(intent)
+    return _routed_reply(state, intent, tool_call, _run_tool(tool_call), start)
+
+
+@timed_node("route_intent")
+async def aroute_intent(state: ChatState) -> dict:
+    """
+    Async version of route_intent; the tool runs on the tool pool.
+    """
+    start = time.perf_counter()
+    intent = _route(state)
+    if intent is None:
+        return {}
+    tool_call = _routed_tool_call(intent)
+    tool_message = await asyncio.wrap_future(_submit_tool(tool_call))
+    return _routed_reply(state, intent, tool_call, tool_message, start)
+
+
 # --- Graph Definition ---
 graph = StateGraph(ChatState)
 
-graph.add_node("call_gemini", call_gemini)
-graph.add_node("execute_tool", execute_tool)
+# Each node has a sync and an async implementation: app.invoke uses the former,
+# app.ainvoke (used by the FastAPI endpoint) the latter.
+graph.add_node("call_gemini", RunnableLambda(call_gemini, afunc=acall_gemini))
+graph.add_node("execute_tool", RunnableLambda(execute_tool, afunc=aexecute_tool))
+graph.add_node("manage_context", manage_context)
+graph.add_node("route_intent", RunnableLambda(route_intent, afunc=aroute_intent))
+graph.add_node("over_budget", over_budget)
 
-graph.set_entry_point("call_gemini")
+# Context is managed once per user turn; the tool loop below doesn't revisit it.
+graph.set_entry_point("manage_context")
+graph.add_edge("manage_context", "route_intent")
+
+# The router either answered the message (its reply is the last message) or
+# passes it on to Gemini.
+graph.add_conditional_edges(
+    "route_intent",
+    lambda state: "answered" if isinstance(state["messages"][-1], AIMessage) else "model",
+    {
+        "answered": END,
+        "model": "call_gemini",
+    }
+)
 
 # Define conditional edges from "call_gemini"
 # After Gemini's response, check if it's a tool call or a regular text response.
+# Tool calls past the turn's budget (see budget.py) end it with a partial answer.
 graph.add_conditional_edges(
     "call_gemini",
-    # This lambda function checks the last message in the state
-    lambda state: "tool_call" if isinstance(state["messages"][-1], AIMessage) and state["messages"][-1].tool_calls else "text_response",
+    _after_gemini,
     {
         "tool_call": "execute_tool", # If Gemini wants to call a tool, go to execute_tool node
         "text_response": END,       # If Gemini provides a direct text response, end the turn
+        "over_budget": "over_budget",
     }
 )
 
-# After executing a tool, always loop back to call_gemini to let it process the tool's result
-# and generate a final user-facing response.
-graph.add_edge("execute_tool", "call_gemini")
+# After executing a tool, loop back to call_gemini to let it process the tool's result
+# and generate a final user-facing response, unless the budget is spent.
+graph.add_conditional_edges(
+    "execute_tool",
+    _after_tools,
+    {
+        "call_gemini": "call_gemini",
+        "over_budget": "over_budget",
+    }
+)
+graph.add_edge("over_budget", END)
 
 app = graph.compile()
 
 
 
-fast_app = FastAPI()
+# The background prefetch keeps this many days ahead (plus today and
+# yesterday) cached and synced, so "what's on today / this week?" lookups are
+# served without a network call.
+CALENDAR_PREFETCH_DAYS = int(os.getenv("CALENDAR_PREFETCH_DAYS", "7"))
+CALENDAR_PREFETCH_INTERVAL = float(os.getenv("CALENDAR_PREFETCH_INTERVAL", str(CALENDAR_CACHE_FRESHNESS / 3)))
+
+
+def prefetch_upcoming_events() -> None:
+    today = _now().date()
+    start = today - timedelta(days=1)
+    end = today + timedelta(days=CALENDAR_PREFETCH_DAYS)
+    calendar_cache.prefetch('primary', f"{start.isoformat()}T00:00:00Z", f"{end.isoformat()}T23:59:59Z")
+
+
+def background_jobs() -> BackgroundScheduler:
+    scheduler = BackgroundScheduler()
+    # Returns its own next delay: just before the token is due for refresh.
+    scheduler.add_job("token_refresh", refresh_credentials, interval=60, initial_delay=5)
+    scheduler.add_job("calendar_prefetch", prefetch_upcoming_events, interval=CALENDAR_PREFETCH_INTERVAL, initial_delay=1)
+    return scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the Google clients in the background: the server accepts requests
+    # right away and the first chat usually finds them ready.
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    # Token refresh and calendar prefetch run off the request path, once per
+    # worker; the token file lock keeps workers from refreshing twice.
+    scheduler = background_jobs() if BACKGROUND_JOBS_ENABLED else None
+    if scheduler is not None:
+        scheduler.start()
+    yield
+    warm_up_task.cancel()
+    if scheduler is not None:
+        await scheduler.stop()
+
+
+fast_app = FastAPI(lifespan=lifespan)
 
 class ChatRequest(BaseModel):
     text: str
+    session_id: Optional[str] = None
+
 
+# Conversation state is keyed by session id, so every app.invoke only carries
+# its own session's messages. Backend is picked with SESSION_STORE=sqlite|memory;
+# with sqlite (the default), requests can be routed to any worker
+# (e.g. uvicorn backend:fast_app --workers 4).
+session_store = create_session_store()
+
+# Answers to repeated read-only questions, valid until the calendar changes.
+response_cache = ResponseCache(registry, calendar_cache.current_version)
+metrics.registry.counter(
+    "response_cache_lookups_total", "Response cache lookups answered without running the graph (hit) or not (miss).", ("result",),
+    function=lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses},
+)
 
-initial_state_get_events = ChatState(messages=[])
+
+def _cached_turn(state: dict, text: str, today: str, context: str) -> Optional[dict]:
+    """
+    The final state for this question answered from the response cache, or None.
+    Blocking (it may read the shared calendar store).
+    """
+    cached = response_cache.get(text, today, context)
+    if cached is None:
+        return None
+    return {**state, "messages": state["messages"] + cached}
+
+
+def _run_config(session_id: str, **configurable) -> dict:
+    """
+    Graph config for one chat request: its session, its deadline
+    (REQUEST_DEADLINE_SECONDS from now) and a recursion limit above the tool budget.
+    """
+    return {
+        "configurable": {"session_id": session_id, "deadline": new_deadline(), **configurable},
+        "recursion_limit": budget.recursion_limit(),
+    }
+
+
+def _record_turn(final_state: dict) -> None:
+    """
+    Observes the number of Gemini calls in the turn that just ran, and dumps
+    the whole state when debug logging is on (too costly to do otherwise).
+    """
+    messages = final_state["messages"]
+    iterations = 0
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            break
+        iterations += isinstance(msg, AIMessage)
+    metrics.graph_iterations.observe(iterations)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Final state: %s", json.dumps(final_state, indent=2, default=str))
+
+
+async def _chat_turn(state: dict, text: str, session_id: str) -> dict:
+    """
+    Runs one user turn for /chat (and benchmarks/replay.py): from the response
+    cache if possible, otherwise through the graph, caching the result.
+    Args:
+        state: The session's state, with the user's message already appended.
+    Returns:
+        The final state.
+    """
+    today = _now().strftime("%Y-%m-%d")
+    context = conversation_context(state["messages"])
+    final_state = await asyncio.to_thread(_cached_turn, state, text, today, context)
+    if final_state is None:
+        calendar_version = calendar_cache.version
+        final_state = await app.ainvoke(state, config=_run_config(session_id))
+        response_cache.put(text, today, turn_messages(final_state["messages"]), calendar_version, context)
+        _record_turn(final_state)
+    return final_state
 
 
 @fast_app.post("/chat")
-async def chat_endpoint(req: ChatRequest):
-    # Replace with your actual logic or AI call
-    print("\n--- Running the graph for 'get_calendar_events' ---")
-    initial_state_get_events["messages"].append(HumanMessage(content=req.text))
-    final_state = app.invoke(initial_state_get_events)
-    initial_state_get_events["messages"] = final_state["messages"]
-    print("\n--- Final State after 'get_calendar_events' ---")
-    print(json.dumps(final_state, indent=2, default=str))
+async def chat_endpoint(req: ChatRequest, x_session_id: Optional[str] = Header(default=None)):
+    # The session id can come in the body or the X-Session-Id header; a new one is minted otherwise.
+    session_id = req.session_id or x_session_id or uuid.uuid4().hex
+    with span("chat", metrics.request_duration, endpoint="chat"):
+        # Off the event loop: the SQLite store serializes up to max_messages
+        # messages and may wait on another worker's write.
+        state = await asyncio.to_thread(session_store.load, session_id)
+        state["messages"].append(HumanMessage(content=req.text))
+        final_state = await _chat_turn(state, req.text, session_id)
+        await asyncio.to_thread(session_store.save, session_id, final_state)
     reply = final_state["messages"][-1].content
-    return {"reply": reply}
+    return {"reply": reply, "session_id": session_id}
+
+
+def _sse(event: dict) -> str:
+    """
+    Formats one graph event as a Server-Sent Events frame.
+    """
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+@fast_app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest, x_session_id: Optional[str] = Header(default=None)):
+    """
+    Same as /chat, but streams graph events as Server-Sent Events while the
+    graph runs: "tool_start"/"tool_end" around each tool call, "token" for
+    every chunk of model text, then a final "done" with the full reply.
+    """
+    session_id = req.session_id or x_session_id or uuid.uuid4().hex
+    state = await asyncio.to_thread(session_store.load, session_id)
+    state["messages"].append(HumanMessage(content=req.text))
+
+    async def event_stream():
+        start = time.perf_counter()
+        today = _now().strftime("%Y-%m-%d")
+        context = conversation_context(state["messages"])
+        final_state = await asyncio.to_thread(_cached_turn, state, req.text, today, context)
+        if final_state is not None:
+            await asyncio.to_thread(session_store.save, session_id, final_state)
+            reply = final_state["messages"][-1].content
+            metrics.request_duration.observe(time.perf_counter() - start, endpoint="chat_stream")
+            yield _sse({"type": "token", "text": reply})
+            yield _sse({"type": "done", "reply": reply, "session_id": session_id})
+            return
+        final_state = state
+        calendar_version = calendar_cache.version
+        streamed = ""  # text streamed since the last tool step
+        streamed_any = False
+        try:
+            async for mode, chunk in app.astream(
+                state,
+                config=_run_config(session_id, stream_tokens=True),
+                stream_mode=["custom", "values"],
+            ):
+                if mode == "custom":
+                    if chunk["type"] == "token":
+                        streamed += chunk["text"]
+                        streamed_any = True
+                    elif chunk["type"] in ("tool_start", "tool_end"):
+                        streamed = ""
+                    yield _sse(chunk)
+                else:
+                    final_state = chunk
+        except Exception as e:
+            logger.exception("Error while streaming session %s", session_id)
+            yield _sse({"type": "error", "message": str(e), "session_id": session_id})
+            return
+        await asyncio.to_thread(session_store.save, session_id, final_state)
+        response_cache.put(req.text, today, turn_messages(final_state["messages"]), calendar_version, context)
+        metrics.request_duration.observe(time.perf_counter() - start, endpoint="chat_stream")
+        _record_turn(final_state)
+        reply = final_state["messages"][-1].content
+        if reply.strip() != streamed.strip():
+            # A reply that wasn't streamed (an error or partial answer from a
+            # failed or over-budget step) still reaches the client as text.
+            yield _sse({"type": "token", "text": f"\n\n{reply}" if streamed_any else reply})
+        yield _sse({"type": "done", "reply": reply, "session_id": session_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@fast_app.get("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus text exposition of this worker's metrics.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @fast_app.get("/")
@@ -0,0 +1,64 @@
+"""
+Concurrency benchmark for the /chat endpoint against stubbed Gemini and
+Calendar clients.
+
+Each chat does two Gemini calls and one Calendar call, so a single chat takes
+about 2 * gemini_latency + calendar_latency. With the async graph, N concurrent
+chats should finish in about that time too, not N times it.
+Gemini calls are capped at GEMINI_MAX_CONCURRENCY per process (8 by default),
+so beyond that chats queue; raise it to measure the graph alone.
+The intent router and the response cache are turned off, so every chat goes
+through Gemini.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_concurrency --chats 20 --gemini-latency 0.2 --calendar-latency 0.1
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import backend
+import google_clients
+from benchmarks.fakes import FakeCalendarService, FakeGenerativeModel
+from session_store import InMemorySessionStore
+
+
+async def run_chats(n: int) -> float:
+    transport = httpx.ASGITransport(app=backend.fast_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/chat", json={"text": "What's on today?", "session_id": f"bench-{i}"})
+            for i in range(n)
+        ])
+        elapsed = time.perf_counter() - start
+    for r in responses:
+        r.raise_for_status()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--calendar-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    google_clients.set_gemini_model(FakeGenerativeModel(latency=args.gemini_latency))
+    google_clients.set_calendar_service(FakeCalendarService(latency=args.calendar_latency))
+    backend.INTENT_ROUTER_ENABLED = False
+    backend.session_store = InMemorySessionStore()  # every run starts from empty sessions
+    backend.response_cache.ttl_seconds = 0
+
+    single = 2 * args.gemini_latency + args.calendar_latency
+    elapsed = asyncio.run(run_chats(args.chats))
+    print(f"chats={args.chats} single_chat_latency~{single:.2f}s")
+    print(f"wall time:            {elapsed:.2f}s")
+    print(f"sum of latencies:     {single * args.chats:.2f}s")
+    print(f"speedup vs serial:    {single * args.chats / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: EventIndex lookups versus the linear Python filtering that
+get_calendar_events used to do, over synthetic calendars.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_event_index --sizes 10000 100000
+"""
+import argparse
+import math
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from event_index import EventIndex, event_bounds, parse_time
+
+WORDS = ["standup", "design", "review", "planning", "sync", "retro", "lunch", "interview",
+         "demo", "budget", "roadmap", "offsite", "training", "1:1", "hiring", "launch"]
+PEOPLE = [f"user{i}@example.com" for i in range(500)]
+
+
+def synthetic_events(n: int, seed: int = 0) -> list:
+    """
+    n events spread over two years, 15 minutes to 2 hours long, a few all-day.
+    """
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    events = []
+    for i in range(n):
+        start = base + timedelta(minutes=15 * rng.randrange(2 * 365 * 24 * 4))
+        if rng.random() < 0.02:
+            day = start.date()
+            when = {"start": {"date": day.isoformat()}, "end": {"date": (day + timedelta(days=rng.randint(1, 3))).isoformat()}}
+        else:
+            end = start + timedelta(minutes=15 * rng.randint(1, 8))
+            when = {"start": {"dateTime": start.isoformat()}, "end": {"dateTime": end.isoformat()}}
+        events.append({
+            "id": f"evt{i}",
+            "summary": " ".join(rng.sample(WORDS, 2)).title(),
+            "attendees": [{"email": e} for e in rng.sample(PEOPLE, rng.randint(0, 4))],
+            **when,
+        })
+    return events
+
+
+def linear_filter(events: list, lo: float, hi: float, summary_keyword: str = None, attendee_email: str = None) -> list:
+    """
+    The old get_calendar_events loop, plus the time-range check the API used to do.
+    """
+    filtered_events = []
+    for event in events:
+        start, end = event_bounds(event)
+        if not (end > lo and start < hi):
+            continue
+        match = True
+        if summary_keyword and summary_keyword.lower() not in event.get('summary', '').lower():
+            match = False
+        if attendee_email and attendee_email.lower() not in [a['email'].lower() for a in event.get('attendees', [])]:
+            match = False
+        if match:
+            filtered_events.append(event)
+    return filtered_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    day_lo, day_hi = parse_time("2025-07-03T00:00:00Z"), parse_time("2025-07-03T23:59:59Z")
+    week_hi = parse_time("2025-07-09T23:59:59Z")
+    queries = {
+        "one day": (day_lo, day_hi, None, None),
+        "one week + keyword": (day_lo, week_hi, "review", None),
+        "all time + attendee": (-math.inf, math.inf, None, PEOPLE[7]),
+        "all time + keyword + attendee": (-math.inf, math.inf, "launch", PEOPLE[7]),
+    }
+
+    for n in args.sizes:
+        events = synthetic_events(n)
+        index = EventIndex()
+        build = timeit.timeit(lambda: [index.put(e) for e in events], number=1)
+        print(f"\n{n} events (index build {build:.2f}s)")
+        print(f"{'query':<32} {'linear':>12} {'index':>12} {'speedup':>8} {'hits':>6}")
+        for name, (lo, hi, keyword, attendee) in queries.items():
+            expected = linear_filter(events, lo, hi, keyword, attendee)
+            got = index.search(lo, hi, keyword, attendee)
+            assert {e["id"] for e in got} == {e["id"] for e in expected}, name
+            linear = min(timeit.repeat(lambda: linear_filter(events, lo, hi, keyword, attendee), number=1, repeat=args.repeat))
+            indexed = min(timeit.repeat(lambda: index.search(lo, hi, keyword, attendee), number=1, repeat=args.repeat))
+            print(f"{name:<32} {linear * 1e3:>10.2f}ms {indexed * 1e3:>10.3f}ms {linear / indexed:>7.0f}x {len(got):>6}")
+
+
+if __name__ == "__main__":
+    main()
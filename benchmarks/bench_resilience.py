@@ -0,0 +1,72 @@
+"""
+Behaviour of the Gemini resilience layer under injected failures, against
+stubbed Gemini and Calendar clients.
+
+1. Rate limiting: a fraction of Gemini calls fail with 429. Retries with
+   jittered backoff should turn nearly all chats into real answers.
+2. Outage: every Gemini call fails with 503. Once the circuit breaker opens,
+   chats must fail fast (with a friendly reply) instead of each one waiting
+   out its retries.
+
+The intent router and the response cache are turned off, so every chat goes
+through Gemini.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_resilience --chats 50 --error-rate 0.3
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import backend
+import google_clients
+from benchmarks.fakes import FakeCalendarService, FakeGenerativeModel
+from resilience import CircuitBreaker, ResilientCaller
+from session_store import InMemorySessionStore
+
+
+async def run_chats(n: int, prefix: str) -> tuple:
+    transport = httpx.ASGITransport(app=backend.fast_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/chat", json={"text": "What's on today?", "session_id": f"{prefix}-{i}"})
+            for i in range(n)
+        ])
+        elapsed = time.perf_counter() - start
+    replies = [r.json()["reply"] for r in responses]
+    answered = sum(reply == "You have 2 events today." for reply in replies)
+    return answered, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.3)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--retry-base-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    model = FakeGenerativeModel(latency=args.gemini_latency, error_rate=args.error_rate)
+    google_clients.set_gemini_model(model)
+    google_clients.set_calendar_service(FakeCalendarService(latency=0.01))
+    backend.INTENT_ROUTER_ENABLED = False
+    backend.session_store = InMemorySessionStore()  # every run starts from empty sessions
+    backend.response_cache.ttl_seconds = 0
+    backend.gemini_caller = ResilientCaller(base_delay=args.retry_base_delay, max_delay=1, breaker=CircuitBreaker(reset_seconds=60))
+
+    answered, elapsed = asyncio.run(run_chats(args.chats, "rate"))
+    print(f"[429 on {args.error_rate:.0%} of calls] answered {answered}/{args.chats} chats in {elapsed:.2f}s "
+          f"({model.calls} good calls, {model.errors} injected errors, breaker {backend.gemini_caller.breaker.state})")
+
+    model.down = True
+    errors_before = model.errors
+    answered, elapsed = asyncio.run(run_chats(args.chats, "outage"))
+    print(f"[outage] answered {answered}/{args.chats} chats in {elapsed:.2f}s, "
+          f"{model.errors - errors_before} calls reached Gemini, breaker {backend.gemini_caller.breaker.state}")
+
+
+if __name__ == "__main__":
+    main()
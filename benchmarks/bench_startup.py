@@ -0,0 +1,64 @@
+"""
+Startup benchmark: time from launching uvicorn to the first 200 from GET /.
+
+Importing backend no longer authenticates or builds Google clients, so this
+should be dominated by Python imports and work from a directory without a
+token.json (warm-up then just logs that credentials are missing).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_response(timeout: float) -> float:
+    port = free_port()
+    env = dict(os.environ, OAUTH_INTERACTIVE="0")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend:fast_app", "--port", str(port), "--log-level", "warning"],
+        stdin=subprocess.DEVNULL, env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with code {server.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+        raise TimeoutError(f"no response within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    times = [time_to_first_response(args.timeout) for _ in range(args.runs)]
+    print(f"runs={args.runs}")
+    print(f"time to first 200:    median {statistics.median(times):.2f}s, min {min(times):.2f}s, max {max(times):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
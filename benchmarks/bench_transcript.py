@@ -0,0 +1,95 @@
+"""
+Micro-benchmark: cost of preparing Gemini `contents` for one call_gemini step
+as the conversation grows.
+
+"full rebuild" is what call_gemini used to do on every step: convert every
+message, json.loads every past tool result, rebuild the history dicts and let
+start_chat convert them to protos. "incremental" is GeminiTranscript.sync
+after one new message has been appended.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_transcript --lengths 10 50 100 200 500
+"""
+import argparse
+import json
+import timeit
+
+from google.generativeai.types import content_types
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import backend
+
+
+def synthetic_history(length: int) -> list:
+    """
+    Repeats a user -> tool call -> tool result -> answer turn until `length` messages.
+    """
+    events = [
+        {"id": f"evt{i}", "summary": f"Meeting {i}", "start": {"dateTime": "2025-07-03T09:00:00Z"},
+         "end": {"dateTime": "2025-07-03T10:00:00Z"}, "attendees": [{"email": "alice@example.com"}]}
+        for i in range(5)
+    ]
+    turn = [
+        HumanMessage(content="What's on today?"),
+        AIMessage(content="", tool_calls=[{"id": "call_0", "name": "get_calendar_events", "args": {"start_date": "2025-07-03"}}]),
+        ToolMessage(name="get_calendar_events", content=json.dumps({"events": events}), tool_call_id="call_0"),
+        AIMessage(content="You have 5 meetings today."),
+    ]
+    return [turn[i % len(turn)].model_copy() for i in range(length)]
+
+
+def to_gemini_messages(messages: list) -> list:
+    """
+    Converts a whole LangChain history in one go, grouping the results of a
+    parallel tool step into one turn like GeminiTranscript.sync does.
+    """
+    gemini_messages = []
+    previous = None
+    for msg in messages:
+        gemini_message = backend._to_gemini_message(msg)
+        if gemini_message is None:
+            continue
+        if isinstance(msg, ToolMessage) and isinstance(previous, ToolMessage):
+            gemini_messages[-1]["parts"].extend(gemini_message["parts"])
+        else:
+            gemini_messages.append(gemini_message)
+        previous = msg
+    return gemini_messages
+
+
+def full_rebuild(messages: list) -> list:
+    gemini_messages = to_gemini_messages(messages)
+    history_dicts = [
+        {"role": m["role"], "parts": [{"text": p.text} if hasattr(p, "text") else p for p in m["parts"]]}
+        for m in gemini_messages[:-1]
+    ]
+    return content_types.to_contents(history_dicts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 50, 100, 200, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'full rebuild':>14} {'incremental':>14} {'speedup':>8}")
+    for length in args.lengths:
+        messages = synthetic_history(length)
+        full = min(timeit.repeat(lambda: full_rebuild(messages), number=1, repeat=args.repeat))
+
+        transcript = backend.GeminiTranscript()
+        transcript.sync(messages[:-1])
+
+        def step():
+            transcript.sync(messages)
+            # Undo the append so every repeat measures the same one-message step.
+            transcript.contents.pop()
+            transcript.converted -= 1
+            transcript.last_message = messages[-2]
+
+        incremental = min(timeit.repeat(step, number=1, repeat=args.repeat))
+        print(f"{length:>8} {full * 1e3:>12.3f}ms {incremental * 1e3:>12.3f}ms {full / incremental:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Throughput of /chat with 1 vs N uvicorn workers, all sharing the SQLite
+session store and calendar cache (the default stores).
+
+Chats are spread over a fixed set of session ids, sent round-robin without
+affinity, so consecutive turns of a session usually land on different workers.
+Each response is checked to contain all earlier turns of its session.
+
+Throughput only scales with workers as far as there are CPU cores to run them.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_workers --workers 1 4 --requests 400 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, port: int, db_dir: str, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SESSION_DB_PATH=os.path.join(db_dir, "sessions.db"),
+        CALENDAR_CACHE_DB_PATH=os.path.join(db_dir, "calendar_cache.db"),
+        BENCH_GEMINI_LATENCY=str(args.gemini_latency),
+        BENCH_CALENDAR_LATENCY=str(args.calendar_latency),
+        OAUTH_INTERACTIVE="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.stub_app:fast_app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, env=env,
+    )
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise TimeoutError("server did not start")
+
+
+async def run_load(port: int, args) -> float:
+    sessions = [f"bench-{i}" for i in range(args.sessions)]
+    turns = {s: 0 for s in sessions}
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(sessions[i % len(sessions)])
+    session_locks = {s: asyncio.Lock() for s in sessions}
+
+    async def client_loop(client):
+        while not queue.empty():
+            session_id = queue.get_nowait()
+            # Turns of one session are sequential, as they would be from one user.
+            async with session_locks[session_id]:
+                r = await client.post("/chat", json={"text": f"turn {turns[session_id]}", "session_id": session_id})
+                r.raise_for_status()
+                turns[session_id] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[client_loop(client) for _ in range(args.concurrency)])
+        return time.perf_counter() - start
+
+
+def check_history(db_path: str, args) -> None:
+    from session_store import SQLiteSessionStore
+    store = SQLiteSessionStore(db_path)
+    for i in range(args.sessions):
+        expected = len(range(i, args.requests, args.sessions))
+        humans = [m for m in store.load(f"bench-{i}")["messages"] if m.type == "human"]
+        if len(humans) != expected:
+            raise AssertionError(f"bench-{i}: {len(humans)} turns stored, expected {expected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--gemini-latency", type=float, default=0.05)
+    parser.add_argument("--calendar-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} requests={args.requests} sessions={args.sessions} concurrency={args.concurrency}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as db_dir:
+            port = free_port()
+            server = start_server(workers, port, db_dir, args)
+            try:
+                elapsed = asyncio.run(run_load(port, args))
+            finally:
+                server.terminate()
+                server.wait()
+            check_history(os.path.join(db_dir, "sessions.db"), args)
+            print(f"workers={workers:<3} {args.requests / elapsed:8.1f} req/s  ({elapsed:.2f}s, histories intact)")
+
+
+if __name__ == "__main__":
+    main()
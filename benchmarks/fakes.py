@@ -0,0 +1,355 @@
+"""
+Offline stand-ins for Gemini and the Google Calendar service used by the
+benchmarks. They mimic just enough of the client surface that backend.py
+touches, with a configurable per-call latency.
+"""
+import asyncio
+import math
+import random
+import time
+import uuid
+
+import httplib2
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import protos
+from googleapiclient.errors import HttpError
+
+from event_index import event_bounds, format_time, parse_time
+
+
+class FakeFunctionCall:
+    def __init__(self, name: str, args: dict):
+        self.id = f"call_{uuid.uuid4().hex[:8]}"
+        self.name = name
+        # Proto args (MapComposite, lists as RepeatedComposite), as the real client returns them.
+        self.args = protos.FunctionCall(name=name, args=args).args
+
+
+class FakePart:
+    def __init__(self, text: str = None, function_call: FakeFunctionCall = None):
+        self.text = text
+        self.function_call = function_call
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, parts: list, prompt_tokens: int = 0):
+        self.parts = parts
+        self.text = "".join(p.text or "" for p in parts)
+        self.usage_metadata = FakeUsage(prompt_tokens, len(self.text) // 4 + 1)
+
+
+class FakeStreamResponse(FakeResponse):
+    """
+    Async-iterable response for send_message_async(..., stream=True): text is
+    yielded word by word, function calls as a single chunk.
+    """
+
+    def __init__(self, parts: list, latency: float):
+        super().__init__(parts)
+        self.latency = latency
+
+    async def __aiter__(self):
+        for part in self.parts:
+            if part.function_call:
+                yield FakeResponse([part])
+                continue
+            for word in part.text.split(" "):
+                await asyncio.sleep(self.latency)
+                yield FakeResponse([FakePart(text=word + " ")])
+
+
+class FakeChat:
+    """
+    Asks for get_calendar_events on a user turn and answers in text once the
+    tool result is back, i.e. the common two-round-trip conversation shape.
+    """
+
+    def __init__(self, model, history: list):
+        self.model = model
+        self.history = history
+
+    def _reply(self, parts: list) -> FakeResponse:
+        self.model.calls += 1
+        # parts are dicts or protos.Part; `in` checks the key / set field on both.
+        # A rough prompt size: every history turn counts as 50 tokens.
+        prompt_tokens = 50 * (len(self.history) + 1)
+        if any("function_response" in p for p in parts):
+            return FakeResponse([FakePart(text="You have 2 events today.")], prompt_tokens)
+        return FakeResponse([
+            FakePart(function_call=FakeFunctionCall(
+                "get_calendar_events", {"start_date": f"2025-07-{3 + i:02d}", "end_date": f"2025-07-{3 + i:02d}"}
+            ))
+            for i in range(self.model.tool_calls)
+        ], prompt_tokens)
+
+    def send_message(self, parts, **kwargs):
+        time.sleep(self.model.latency)
+        self.model.maybe_fail()
+        return self._reply(parts)
+
+    async def send_message_async(self, parts, stream: bool = False, **kwargs):
+        self.model.maybe_fail()
+        if stream:
+            # Time to first chunk is a fraction of the full call latency.
+            await asyncio.sleep(self.model.latency / 4)
+            return FakeStreamResponse(self._reply(parts).parts, self.model.latency / 20)
+        await asyncio.sleep(self.model.latency)
+        return self._reply(parts)
+
+
+class FakeGenerativeModel:
+    """
+    Args:
+        latency: Seconds per send_message.
+        tool_calls: Function calls Gemini asks for in one response.
+        error_rate: Fraction of calls failing with 429 Too Many Requests.
+        seed: Seed for the error injection, so runs are repeatable.
+    Set `down` to make every call fail with 503, as in an outage.
+    """
+
+    def __init__(self, latency: float = 0.2, tool_calls: int = 1, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.tool_calls = tool_calls
+        self.error_rate = error_rate
+        self.down = False
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+
+    def maybe_fail(self) -> None:
+        if self.down:
+            self.errors += 1
+            raise api_exceptions.ServiceUnavailable("injected outage")
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            raise api_exceptions.TooManyRequests("injected rate limit")
+
+    def start_chat(self, history=None):
+        return FakeChat(self, history or [])
+
+
+def _field(obj, name: str):
+    # Contents and parts are dicts or protos, depending on where they were built.
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+class ScriptedChat(FakeChat):
+    """
+    Replays the recorded model responses of a transcript turn. The turn is
+    found from the conversation itself (the latest user text, and how many
+    function-call steps followed it), so one model serves many sessions.
+    """
+
+    def _locate(self, parts) -> tuple:
+        steps = 0
+        for content_parts in [parts] + [_field(c, "parts") for c in reversed(self.history)]:
+            if any("function_call" in p for p in content_parts):
+                steps += 1
+                continue
+            texts = [_field(p, "text") for p in content_parts if _field(p, "text")]
+            if texts:
+                return texts[0], steps
+        return None, steps
+
+    def _reply(self, parts: list) -> FakeResponse:
+        self.model.calls += 1
+        user_text, step = self._locate(parts)
+        script = self.model.scripts.get(user_text, [])
+        prompt_tokens = 50 * (len(self.history) + 1)
+        if step >= len(script):
+            return FakeResponse([FakePart(text="Sorry, I have no recorded answer for that.")], prompt_tokens)
+        response = script[step]
+        if "function_calls" in response:
+            return FakeResponse([
+                FakePart(function_call=FakeFunctionCall(call["name"], call.get("args", {})))
+                for call in response["function_calls"]
+            ], prompt_tokens)
+        return FakeResponse([FakePart(text=response["text"])], prompt_tokens)
+
+
+class ScriptedGenerativeModel(FakeGenerativeModel):
+    """
+    Gemini stand-in replaying recorded transcripts.
+    Args:
+        scripts: user text -> list of model responses for that turn, each
+            {"function_calls": [{"name", "args"}, ...]} or {"text": ...}.
+        latency, error_rate, seed: As for FakeGenerativeModel.
+    """
+
+    def __init__(self, scripts: dict, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(latency=latency, error_rate=error_rate, seed=seed)
+        self.scripts = scripts
+
+    def start_chat(self, history=None):
+        return ScriptedChat(self, history or [])
+
+
+def _injected_http_error() -> HttpError:
+    return HttpError(httplib2.Response({"status": 503}), b'{"error": {"message": "injected backend error"}}')
+
+
+class _FakeRequest:
+    def __init__(self, service, run):
+        self.service = service
+        self.run = run
+
+    def execute(self):
+        time.sleep(self.service.latency)
+        self.service.calls += 1
+        self.service.maybe_fail()
+        return self.run()
+
+
+class _FakeBatch:
+    """
+    new_batch_http_request(): one latency for the whole batch, one callback per request.
+    """
+
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None, callback=None):
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+    def execute(self):
+        time.sleep(self.service.latency)
+        self.service.calls += 1
+        for request_id, request, callback in self.requests:
+            try:
+                self.service.maybe_fail()
+                callback(request_id, request.run(), None)
+            except Exception as e:
+                callback(request_id, None, e)
+
+
+class _FakeFreeBusy:
+    def __init__(self, service):
+        self.service = service
+
+    def query(self, body):
+        service = self.service
+
+        def run():
+            # "primary" is busy for every stored event, anyone else for the events they attend.
+            lo, hi = parse_time(body["timeMin"]), parse_time(body["timeMax"])
+            calendars = {}
+            for item in body.get("items", []):
+                cid = item["id"]
+                events = [
+                    e for e in service.store.values()
+                    if cid == "primary" or any(a.get("email") == cid for a in e.get("attendees", []))
+                ]
+                busy = sorted(event_bounds(e) for e in events if event_bounds(e)[1] > lo and event_bounds(e)[0] < hi)
+                calendars[cid] = {"busy": [{"start": format_time(b_lo), "end": format_time(b_hi)} for b_lo, b_hi in busy]}
+            return {"timeMin": body["timeMin"], "timeMax": body["timeMax"], "calendars": calendars}
+        return _FakeRequest(service, run)
+
+
+class _FakeEvents:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, calendarId="primary", timeMin=None, timeMax=None, syncToken=None, pageToken=None, maxResults=250, fields=None, **kwargs):
+        service = self.service
+
+        def run():
+            if syncToken is not None:
+                since = int(syncToken)
+                items = [event for seq, event in service.changes if seq > since]
+            else:
+                lo = parse_time(timeMin) if timeMin else -math.inf
+                hi = parse_time(timeMax) if timeMax else math.inf
+                items = sorted(
+                    (e for e in service.store.values() if event_bounds(e)[1] > lo and event_bounds(e)[0] < hi),
+                    key=lambda e: event_bounds(e)[0],
+                )
+            offset = int(pageToken or 0)
+            page = {"items": items[offset:offset + maxResults]}
+            if offset + maxResults < len(items):
+                page["nextPageToken"] = str(offset + maxResults)
+            else:
+                page["nextSyncToken"] = str(len(service.changes))
+            if fields is not None and "items" not in fields:
+                del page["items"]
+            return page
+        return _FakeRequest(service, run)
+
+    def insert(self, calendarId, body, fields=None):
+        service = self.service
+
+        def run():
+            # Sequential ids (unless the client picked one) keep replays deterministic.
+            event = dict(body)
+            event.setdefault("id", f"new{len(service.changes) + 1}")
+            if event["id"] in service.store:
+                raise HttpError(httplib2.Response({"status": 409}), b'{"error": {"message": "The requested identifier already exists."}}')
+            service.store[event["id"]] = event
+            service.changes.append((len(service.changes) + 1, event))
+            return event
+        return _FakeRequest(service, run)
+
+    def get(self, calendarId, eventId, fields=None):
+        service = self.service
+
+        def run():
+            if eventId not in service.store:
+                raise HttpError(httplib2.Response({"status": 404}), b'{"error": {"message": "Not Found"}}')
+            return service.store[eventId]
+        return _FakeRequest(service, run)
+
+    def delete(self, calendarId, eventId):
+        service = self.service
+
+        def run():
+            if service.store.pop(eventId, None) is None:
+                raise HttpError(httplib2.Response({"status": 410}), b'{"error": {"message": "Resource has been deleted"}}')
+            service.changes.append((len(service.changes) + 1, {"id": eventId, "status": "cancelled"}))
+            return ""
+        return _FakeRequest(service, run)
+
+
+class FakeCalendarService:
+    """
+    In-memory Calendar v3 service: service.events().list/insert/delete(...).execute()
+    and service.freebusy().query(...).execute(), including time-window filtering,
+    pagination, sync tokens and batch requests.
+    Args:
+        latency: Seconds per HTTP round-trip (a batch counts once).
+        events: Initial events; two sample events by default.
+        error_rate: Fraction of requests (or batch items) failing with HTTP 503.
+        seed: Seed for the error injection.
+    """
+
+    def __init__(self, latency: float = 0.1, events: list = None, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self.store = {e["id"]: e for e in (events or [
+            {"id": "evt1", "summary": "Standup", "start": {"dateTime": "2025-07-03T09:00:00Z"}, "end": {"dateTime": "2025-07-03T09:15:00Z"}},
+            {"id": "evt2", "summary": "Design review", "start": {"dateTime": "2025-07-03T14:00:00Z"}, "end": {"dateTime": "2025-07-03T15:00:00Z"}},
+        ])}
+        self.changes = []  # (sequence number, changed event); sync tokens are sequence numbers
+
+    def maybe_fail(self) -> None:
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            raise _injected_http_error()
+
+    def events(self):
+        return _FakeEvents(self)
+
+    def freebusy(self):
+        return _FakeFreeBusy(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self, callback)
@@ -0,0 +1,223 @@
+"""
+Deterministic replay benchmark: recorded conversations (benchmarks/transcripts/
+*.json) are replayed turn by turn and session by session through the same
+code path as the /chat endpoint (response cache, then the compiled LangGraph
+`app` with the request's deadline and recursion limit), with Gemini and
+Calendar replaced by offline fakes and the backend's clock pinned to --now.
+
+Reports, per concurrency level, p50/p95/p99 turn latency and throughput, then
+the memory retained per finished session (session store plus per-session
+caches). Every reply is checked against the recorded one: the turn's "reply",
+or else the last text of its scripted model output.
+
+Fake latencies default to 0, so the numbers measure the backend's own hot path;
+set them (and error rates) to model real services. With --baseline, exits
+non-zero when p95 or memory per session regressed by more than
+--max-regression against a previous --save run.
+
+Usage (from the repository root):
+    python -m benchmarks.replay --concurrency 1 4 16 64 --sessions 64
+    python -m benchmarks.replay --save baseline.json
+    python -m benchmarks.replay --baseline baseline.json --max-regression 0.25
+"""
+import argparse
+import asyncio
+import gc
+import glob
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from langchain_core.messages import HumanMessage
+
+import backend
+import google_clients
+from benchmarks.fakes import FakeCalendarService, ScriptedGenerativeModel
+from session_store import InMemorySessionStore
+
+TRANSCRIPT_DIR = os.path.join(os.path.dirname(__file__), "transcripts")
+
+
+def load_transcripts(pattern: str) -> list:
+    paths = sorted(glob.glob(os.path.join(TRANSCRIPT_DIR, pattern)))
+    if not paths:
+        raise SystemExit(f"No transcripts match {pattern} in {TRANSCRIPT_DIR}")
+    transcripts = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            transcripts.append(json.load(f))
+    return transcripts
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+class Replayer:
+    def __init__(self, transcripts: list, args):
+        self.transcripts = transcripts
+        self.args = args
+        scripts = {}
+        for transcript in transcripts:
+            for turn in transcript["turns"]:
+                scripts[turn["user"]] = turn["model"]
+        self.scripts = scripts
+        self.seed_events = [e for t in transcripts for e in t.get("seed_events", [])]
+
+    def reset(self) -> InMemorySessionStore:
+        """
+        Fresh fakes, caches and session store, so every phase starts from the same state.
+        """
+        args = self.args
+        self.model = ScriptedGenerativeModel(self.scripts, latency=args.gemini_latency, error_rate=args.gemini_error_rate, seed=args.seed)
+        self.calendar = FakeCalendarService(
+            latency=args.calendar_latency, events=[dict(e) for e in self.seed_events],
+            error_rate=args.calendar_error_rate, seed=args.seed,
+        )
+        google_clients.set_gemini_model(self.model)
+        google_clients.set_calendar_service(self.calendar)
+        now = datetime.fromisoformat(args.now)
+        backend._now = lambda: now
+        backend.calendar_cache.invalidate()
+        backend.response_cache.clear()
+        with backend._transcripts_lock:
+            backend._transcripts.clear()
+        return InMemorySessionStore(max_sessions=1_000_000, ttl_seconds=3600)
+
+    async def replay_session(self, store, session_id: str, transcript: dict, latencies: list) -> int:
+        """
+        Plays one transcript; returns the number of replies that differ from the recording.
+        """
+        mismatches = 0
+        for turn in transcript["turns"]:
+            start = time.perf_counter()
+            state = store.load(session_id)
+            state["messages"].append(HumanMessage(content=turn["user"]))
+            final_state = await backend._chat_turn(state, turn["user"], session_id)
+            store.save(session_id, final_state)
+            latencies.append(time.perf_counter() - start)
+            if final_state["messages"][-1].content != turn.get("reply", turn["model"][-1]["text"]):
+                mismatches += 1
+        return mismatches
+
+    async def run(self, store, sessions: int, concurrency: int, latencies: list) -> int:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(i: int) -> int:
+            async with semaphore:
+                transcript = self.transcripts[i % len(self.transcripts)]
+                return await self.replay_session(store, f"replay-{i}", transcript, latencies)
+
+        return sum(await asyncio.gather(*[one(i) for i in range(sessions)]))
+
+    def latency_phase(self, concurrency: int) -> dict:
+        store = self.reset()
+        sessions = max(self.args.sessions, concurrency)
+        latencies = []
+        start = time.perf_counter()
+        mismatches = asyncio.run(self.run(store, sessions, concurrency, latencies))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            "concurrency": concurrency,
+            "turns": len(latencies),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "throughput": len(latencies) / elapsed,
+            "mismatches": mismatches,
+        }
+
+    def memory_phase(self) -> dict:
+        # Warm-up first, so one-off allocations (imports, caches) aren't charged to sessions.
+        store = self.reset()
+        asyncio.run(self.run(store, len(self.transcripts), 1, []))
+        store = self.reset()
+        sessions = self.args.memory_sessions
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        asyncio.run(self.run(store, sessions, self.args.memory_concurrency, []))
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        growth = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        return {"sessions": sessions, "bytes_per_session": growth / sessions}
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    """
+    Regressions beyond max_regression (a fraction) against a saved baseline.
+    """
+    problems = []
+    old_levels = {r["concurrency"]: r for r in baseline.get("latency", [])}
+    for r in results["latency"]:
+        old = old_levels.get(r["concurrency"])
+        if old and r["p95_ms"] > old["p95_ms"] * (1 + max_regression):
+            problems.append(f"p95 at concurrency {r['concurrency']}: {old['p95_ms']:.2f}ms -> {r['p95_ms']:.2f}ms")
+    old_memory = baseline.get("memory", {}).get("bytes_per_session")
+    new_memory = results["memory"]["bytes_per_session"]
+    if old_memory and new_memory > old_memory * (1 + max_regression):
+        problems.append(f"memory per session: {old_memory / 1024:.1f}KiB -> {new_memory / 1024:.1f}KiB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transcripts", default="*.json", help="glob within benchmarks/transcripts")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--sessions", type=int, default=64, help="sessions replayed per concurrency level")
+    parser.add_argument("--memory-sessions", type=int, default=200)
+    parser.add_argument("--memory-concurrency", type=int, default=8)
+    parser.add_argument("--gemini-latency", type=float, default=0.0)
+    parser.add_argument("--calendar-latency", type=float, default=0.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--calendar-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--now", default="2025-07-02T09:30:00", help="what the backend's clock reads")
+    parser.add_argument("--save", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    # Keep the backend quiet; injected errors would otherwise log every retry.
+    logging.getLogger().setLevel(logging.ERROR)
+    replayer = Replayer(load_transcripts(args.transcripts), args)
+    print(f"transcripts={len(replayer.transcripts)} gemini_latency={args.gemini_latency}s "
+          f"calendar_latency={args.calendar_latency}s gemini_errors={args.gemini_error_rate:.0%} "
+          f"calendar_errors={args.calendar_error_rate:.0%}")
+    print(f"{'concurrency':>11} {'turns':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'turns/s':>9} {'mismatches':>10}")
+    results = {"latency": []}
+    for concurrency in args.concurrency:
+        r = replayer.latency_phase(concurrency)
+        results["latency"].append(r)
+        print(f"{r['concurrency']:>11} {r['turns']:>6} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r['throughput']:>9.1f} {r['mismatches']:>10}")
+    results["memory"] = replayer.memory_phase()
+    print(f"memory: {results['memory']['bytes_per_session'] / 1024:.1f} KiB retained per session "
+          f"({results['memory']['sessions']} sessions)")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
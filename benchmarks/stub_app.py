@@ -0,0 +1,17 @@
+"""
+backend.fast_app with stubbed Gemini and Calendar clients, for benchmarks that
+run the app in separate uvicorn worker processes:
+
+    uvicorn benchmarks.stub_app:fast_app --workers 4
+
+Stub latencies come from BENCH_GEMINI_LATENCY and BENCH_CALENDAR_LATENCY
+(seconds).
+"""
+import os
+
+import google_clients
+from backend import fast_app  # noqa: F401
+from benchmarks.fakes import FakeCalendarService, FakeGenerativeModel
+
+google_clients.set_gemini_model(FakeGenerativeModel(latency=float(os.getenv("BENCH_GEMINI_LATENCY", "0.05"))))
+google_clients.set_calendar_service(FakeCalendarService(latency=float(os.getenv("BENCH_CALENDAR_LATENCY", "0.02"))))
@@ -0,0 +1,104 @@
+import os
+import time
+from typing import Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+import fast_json
+from event_index import event_time
+from response_cache import turn_messages
+
+
+# --- Per-request budgets for the tool loop ---
+# call_gemini -> execute_tool -> call_gemini is a loop the model decides when
+# to leave. Each user turn gets a budget of tool iterations, Gemini tokens and
+# wall-clock time (the request deadline, REQUEST_DEADLINE_SECONDS); once one is
+# spent the turn ends with a partial answer built from the tool results so far
+# instead of another model call.
+#
+# Usage is read back from the turn's own messages (tool-call AIMessages and
+# their usage_metadata), so the budget needs no state of its own.
+
+MAX_TOOL_ITERATIONS = int(os.getenv("MAX_TOOL_ITERATIONS", "6"))
+MAX_TURN_TOKENS = int(os.getenv("MAX_TURN_TOKENS", "100000"))  # prompt + response, all Gemini calls of a turn; 0 = unlimited
+# A Gemini call isn't started with less than this left before the deadline.
+MIN_CALL_SECONDS = float(os.getenv("MIN_CALL_SECONDS", "1"))
+
+_PARTIAL_EVENTS_LISTED = 5
+
+_REASONS = {
+    "iterations": "it needed more steps than I'm allowed per request",
+    "tokens": "it grew too large to finish in one request",
+    "deadline": "it took too long",
+}
+
+
+def recursion_limit() -> int:
+    """
+    LangGraph recursion limit that never cuts a turn short of its budget:
+    manage_context, route_intent, then a call_gemini/execute_tool pair per
+    iteration and the final answer.
+    """
+    return 2 * MAX_TOOL_ITERATIONS + 5
+
+
+def turn_usage(messages: list) -> tuple:
+    """
+    (tool iterations, Gemini tokens) spent so far in the latest turn.
+    """
+    iterations = tokens = 0
+    for msg in turn_messages(messages):
+        if isinstance(msg, AIMessage):
+            iterations += bool(msg.tool_calls)
+            tokens += (msg.usage_metadata or {}).get("total_tokens", 0)
+    return iterations, tokens
+
+
+def exceeded(messages: list, deadline: Optional[float] = None) -> Optional[str]:
+    """
+    Which budget the turn has spent ("iterations", "tokens" or "deadline"),
+    checked before doing more work on it; None while it may go on.
+    """
+    iterations, tokens = turn_usage(messages)
+    if iterations > MAX_TOOL_ITERATIONS:
+        return "iterations"
+    if MAX_TURN_TOKENS and tokens >= MAX_TURN_TOKENS:
+        return "tokens"
+    if deadline is not None and deadline - time.monotonic() < MIN_CALL_SECONDS:
+        return "deadline"
+    return None
+
+
+def _result_line(msg: ToolMessage) -> str:
+    try:
+        result = fast_json.loads(msg.content)
+    except (TypeError, ValueError):
+        return f"- {msg.name}: {msg.content}"
+    if not isinstance(result, dict):
+        return f"- {msg.name}: {msg.content}"
+    if result.get("status") == "error":
+        return f"- {msg.name} failed: {result.get('message', 'unknown error')}"
+    events = result.get("events")
+    if isinstance(events, list):
+        listed = [
+            f"{e.get('summary') or '(no title)'} ({event_time(e.get('start')) or '?'})"
+            for e in events[:_PARTIAL_EVENTS_LISTED]
+        ]
+        total = result.get("total", len(events))
+        more = f" and {total - len(listed)} more" if total > len(listed) else ""
+        return f"- Found {total} event(s)" + (f": {', '.join(listed)}{more}" if listed else "")
+    return f"- {msg.name}: {result.get('message', 'done')}"
+
+
+def partial_answer(messages: list, reason: str) -> str:
+    """
+    The reply for a turn cut short by its budget: what the turn's tools did
+    and found, so changes already made (e.g. created events) aren't lost on
+    the user.
+    """
+    why = _REASONS.get(reason, "of a limit")
+    # A model stuck in a loop repeats the same calls; report each result once.
+    lines = list(dict.fromkeys(_result_line(msg) for msg in turn_messages(messages) if isinstance(msg, ToolMessage)))
+    if not lines:
+        return f"Sorry, I couldn't finish this request because {why}. Please try again, or ask for something more specific."
+    return f"I couldn't finish this request because {why}. Here is what I did and found so far:\n" + "\n".join(lines)
@@ -0,0 +1,348 @@
+import math
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from googleapiclient.errors import HttpError
+
+import metrics
+from calendar_store import CalendarStore, merge_windows
+from event_index import EventIndex, parse_time
+
+
+# --- Read-through calendar event cache ---
+# Lookups are answered from a local copy of the calendar. Time windows are
+# fetched once (with full pagination) and then kept fresh with the Calendar
+# API's incremental sync: a list call with the last nextSyncToken returns only
+# what changed since, which is usually nothing.
+#
+# With a CalendarStore (several workers), the local index is a replica: changes
+# are written to the store and pulled back, see calendar_store.py.
+
+CALENDAR_CACHE_FRESHNESS = float(os.getenv("CALENDAR_CACHE_FRESHNESS", "30"))
+CALENDAR_CACHE_MAX_EVENTS = int(os.getenv("CALENDAR_CACHE_MAX_EVENTS", "200000"))
+PAGE_SIZE = 2500  # maximum allowed by events.list
+# Partial response: only the event fields the tools and the cache use are
+# requested (and kept), not etag, htmlLink, creator, reminders and the rest.
+EVENT_FIELDS = "id,status,summary,location,start,end,attendees(email,responseStatus),transparency,recurringEventId,recurrence"
+LIST_FIELDS = f"items({EVENT_FIELDS}),nextPageToken,nextSyncToken"
+
+
+class _CalendarState:
+    def __init__(self):
+        self.events = EventIndex()
+        self.windows = []  # merged, sorted (lo, hi) ranges fully fetched into events
+        self.sync_token = None
+        self.last_sync = 0.0  # wall-clock, so workers sharing a store agree on it
+        self.generation = 0  # store generation/version this replica has applied
+        self.store_version = 0
+        # `lock` guards the fields above and is never held across a network call;
+        # `sync_lock` makes concurrent lookups share a single incremental sync.
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+
+    def clear(self) -> None:
+        self.events.clear()
+        self.windows = []
+        self.sync_token = None
+        self.last_sync = 0.0
+        self.store_version = 0
+
+    def covers(self, lo: float, hi: float) -> bool:
+        return any(w_lo <= lo and hi <= w_hi for w_lo, w_hi in self.windows)
+
+    def add_window(self, lo: float, hi: float) -> None:
+        self.windows = merge_windows(self.windows, lo, hi)
+
+
+class CalendarEventCache:
+    """
+    Thread-safe event cache for one or more calendars.
+    Args:
+        get_service: Returns the Calendar API service to use for fetches.
+        freshness_seconds: How long a lookup may be served without asking the
+            API for changes.
+        store: Optional shared store, for running several workers.
+    """
+
+    def __init__(self, get_service: Callable, freshness_seconds: float = CALENDAR_CACHE_FRESHNESS, max_events: int = CALENDAR_CACHE_MAX_EVENTS, store: Optional[CalendarStore] = None):
+        self.get_service = get_service
+        self.store = store
+        self.freshness_seconds = freshness_seconds
+        self.max_events = max_events
+        # Bumped whenever the calendar changes (not when a new window is merely
+        # fetched), so callers can tell their derived data is stale.
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._calendars = {}
+        self._lock = threading.Lock()
+
+    def _calendar(self, calendar_id: str) -> _CalendarState:
+        with self._lock:
+            state = self._calendars.get(calendar_id)
+            if state is None:
+                state = self._calendars[calendar_id] = _CalendarState()
+            return state
+
+    def _changed(self) -> None:
+        self.version += 1
+
+    def current_version(self, calendar_id: str = "primary") -> int:
+        """
+        `version`, after applying changes other workers wrote to the shared
+        store (if any).
+        """
+        if self.store is not None:
+            self._pull(calendar_id, self._calendar(calendar_id))
+        return self.version
+
+    def list_events(self, calendar_id: str = "primary", time_min: Optional[str] = None, time_max: Optional[str] = None, summary_keyword: Optional[str] = None, attendee_email: Optional[str] = None) -> list:
+        """
+        Events overlapping [time_min, time_max), ordered by start time.
+        Args:
+            calendar_id: Calendar to read.
+            time_min: RFC3339 lower bound on event end, or None for unbounded.
+            time_max: RFC3339 upper bound on event start, or None for unbounded.
+            summary_keyword: Optional case-insensitive substring of the summary.
+            attendee_email: Optional case-insensitive attendee email.
+        Returns:
+            List of raw Calendar API event dicts.
+        """
+        lo = parse_time(time_min)
+        hi = parse_time(time_max)
+        lo = -math.inf if lo is None else lo
+        hi = math.inf if hi is None else hi
+        state = self._calendar(calendar_id)
+        if self.store is not None:
+            self._pull(calendar_id, state)
+        if self._is_stale(state):
+            with state.sync_lock:
+                # Another thread may have synced while this one waited.
+                if self._is_stale(state):
+                    self._sync(calendar_id, state)
+        with state.lock:
+            covered = state.covers(lo, hi)
+            if covered:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not covered:
+            self._fetch_window(calendar_id, state, time_min, time_max, lo, hi)
+        with state.lock:
+            return state.events.search(lo, hi, summary_keyword, attendee_email)
+
+    def _is_stale(self, state: _CalendarState) -> bool:
+        return time.time() - state.last_sync > self.freshness_seconds
+
+    def _pull(self, calendar_id: str, state: _CalendarState) -> None:
+        """
+        Brings the local replica up to date with the shared store.
+        """
+        with state.lock:
+            generation, version = state.generation, state.store_version
+        snapshot = self.store.read(calendar_id, generation, version)
+        if snapshot is None:
+            return
+        with state.lock:
+            if snapshot.generation != state.generation:
+                state.events.clear()
+                state.generation = snapshot.generation
+            elif snapshot.version <= state.store_version:
+                return  # another thread already applied this (or newer)
+            # Another worker's window fetches look like new events here too;
+            # that only costs consumers of `version` a spurious refresh.
+            changed = self._apply(state, dict(snapshot.changes))
+            state.store_version = snapshot.version
+            state.windows = snapshot.windows
+            state.sync_token = snapshot.sync_token
+            state.last_sync = snapshot.synced_at
+        if changed or generation != snapshot.generation:
+            self._changed()
+
+    @staticmethod
+    def _apply(state: _CalendarState, changes: dict, fill: bool = False) -> bool:
+        """
+        Applies changes to the local index. Caller holds state.lock.
+        Returns:
+            Whether any event was actually added, modified or removed; with
+            `fill`, events new to the cache don't count (they come from a
+            window that wasn't cached before).
+        """
+        changed = False
+        for event_id, event in changes.items():
+            if event is None:
+                changed |= state.events.pop(event_id) is not None
+                continue
+            existing = state.events.events.get(event_id)
+            if existing == event:
+                continue
+            changed |= existing is not None or not fill
+            state.events.put(event)
+        return changed
+
+    def _commit(self, calendar_id: str, state: _CalendarState, changes: Optional[dict] = None, clear: bool = False, reset_windows: bool = False, window: Optional[tuple] = None, sync_token: Optional[str] = None, synced: bool = False, fill: bool = False) -> None:
+        """
+        Applies a batch of changes: to the shared store when there is one
+        (then pulls them back), otherwise straight to the local index.
+        Args:
+            changes: event_id -> event, or None to delete it.
+            clear: Drop everything first.
+            reset_windows: Forget which time ranges are fully fetched.
+            window: A (lo, hi) range now fully fetched.
+            sync_token: New sync token.
+            synced: Whether this completes a sync with the API.
+            fill: The changes come from fetching `window`.
+        """
+        changes = changes or {}
+        if self.store is not None:
+            self.store.write(calendar_id, changes, clear, reset_windows, window, sync_token, time.time() if synced else None)
+            self._pull(calendar_id, state)
+            return
+        with state.lock:
+            if clear:
+                state.clear()
+            if reset_windows:
+                state.windows = []
+            changed = self._apply(state, changes, fill) or clear
+            if window is not None:
+                state.add_window(*window)
+            if sync_token is not None:
+                state.sync_token = sync_token
+            if synced:
+                state.last_sync = time.time()
+        if changed:
+            self._changed()
+
+    def _pages(self, **params):
+        request = self.get_service().events().list(**params)
+        while True:
+            response = metrics.execute(request, "events.list")
+            yield response
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+            request = self.get_service().events().list(**params, pageToken=page_token)
+
+    def _fetch_window(self, calendar_id: str, state: _CalendarState, time_min: Optional[str], time_max: Optional[str], lo: float, hi: float) -> None:
+        params = {"calendarId": calendar_id, "singleEvents": True, "orderBy": "startTime", "maxResults": PAGE_SIZE, "fields": LIST_FIELDS}
+        if time_min:
+            params["timeMin"] = time_min
+        if time_max:
+            params["timeMax"] = time_max
+        items = [event for page in self._pages(**params) for event in page.get("items", [])]
+        changes = {event["id"]: event for event in items if event.get("status") != "cancelled"}
+        self._commit(calendar_id, state, changes, window=(lo, hi), fill=True)
+        with state.lock:
+            too_big = len(state.events) > self.max_events
+        if too_big:
+            # Start over rather than grow without bound; the next lookup refetches.
+            self._commit(calendar_id, state, clear=True)
+
+    def _full_sync(self, calendar_id: str, state: _CalendarState) -> None:
+        # Only the sync token is needed here; cached windows are fetched separately.
+        for page in self._pages(calendarId=calendar_id, maxResults=PAGE_SIZE, fields="nextPageToken,nextSyncToken"):
+            if page.get("nextSyncToken"):
+                self._commit(calendar_id, state, sync_token=page["nextSyncToken"], synced=True)
+
+    def _sync(self, calendar_id: str, state: _CalendarState) -> None:
+        """
+        Applies changes since the last sync token to the cached events.
+        Caller holds state.sync_lock.
+        """
+        if state.sync_token is None:
+            self._full_sync(calendar_id, state)
+            return
+        try:
+            pages = list(self._pages(calendarId=calendar_id, syncToken=state.sync_token, maxResults=PAGE_SIZE, fields=LIST_FIELDS))
+        except HttpError as e:
+            if e.resp.status != 410:
+                raise
+            # 410 Gone: the sync token expired, so nothing cached can be trusted.
+            self._commit(calendar_id, state, clear=True)
+            self._full_sync(calendar_id, state)
+            return
+        changes = {}
+        reset_windows = False
+        sync_token = None
+        with state.lock:
+            for page in pages:
+                for item in page.get("items", []):
+                    reset_windows |= self._plan_change(state, item, changes)
+                if page.get("nextSyncToken"):
+                    sync_token = page["nextSyncToken"]
+        self._commit(calendar_id, state, changes, reset_windows=reset_windows, sync_token=sync_token, synced=True)
+
+    def _plan_change(self, state: _CalendarState, item: dict, changes: dict) -> bool:
+        """
+        Adds the local updates for one synced item to `changes`.
+        Caller holds state.lock.
+        Returns:
+            Whether the cached windows must be forgotten.
+        """
+        event_id = item["id"]
+        if item.get("recurrence"):
+            # A recurring series changed; its expanded instances can't be patched locally.
+            for eid, e in state.events.items():
+                if e.get("recurringEventId") == event_id:
+                    changes[eid] = None
+            return True
+        if item.get("status") == "cancelled":
+            changes[event_id] = None
+            if event_id not in state.events.events:
+                # Possibly a whole series: drop its instances.
+                for eid, e in state.events.items():
+                    if e.get("recurringEventId") == event_id:
+                        changes[eid] = None
+            return False
+        changes[event_id] = item
+        return False
+
+    def prefetch(self, calendar_id: str = "primary", time_min: Optional[str] = None, time_max: Optional[str] = None) -> None:
+        """
+        Background refresh: syncs changes since the last sync token and makes
+        sure [time_min, time_max) is cached, so lookups in that range are
+        answered without a network call. Doesn't count as a lookup.
+        """
+        lo = parse_time(time_min)
+        hi = parse_time(time_max)
+        lo = -math.inf if lo is None else lo
+        hi = math.inf if hi is None else hi
+        state = self._calendar(calendar_id)
+        if self.store is not None:
+            self._pull(calendar_id, state)
+        with state.sync_lock:
+            # Ahead of the lookups' freshness check, unless another worker's
+            # prefetch has just synced the shared store.
+            if time.time() - state.last_sync > self.freshness_seconds / 2:
+                self._sync(calendar_id, state)
+        with state.lock:
+            covered = state.covers(lo, hi)
+        if not covered:
+            self._fetch_window(calendar_id, state, time_min, time_max, lo, hi)
+
+    def record_insert(self, event: dict, calendar_id: str = "primary") -> None:
+        """
+        Adds an event just created through the API so reads see it immediately.
+        """
+        self._commit(calendar_id, self._calendar(calendar_id), {event["id"]: event})
+
+    def record_delete(self, event_id: str, calendar_id: str = "primary") -> None:
+        """
+        Drops an event just deleted through the API.
+        """
+        self._commit(calendar_id, self._calendar(calendar_id), {event_id: None})
+
+    def invalidate(self, calendar_id: Optional[str] = None) -> None:
+        """
+        Forgets one calendar, or everything when calendar_id is None.
+        """
+        if calendar_id is None:
+            with self._lock:
+                calendar_ids = list(self._calendars)
+        else:
+            calendar_ids = [calendar_id]
+        for cid in calendar_ids:
+            self._commit(cid, self._calendar(cid), clear=True)
+        self._changed()
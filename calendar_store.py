@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+# --- Shared storage behind CalendarEventCache ---
+# With several backend workers, each one keeps its own in-memory EventIndex as
+# a replica of a shared store. Writes (API fetches, syncs, local inserts and
+# deletes) go to the store first; every replica then pulls the rows changed
+# since the version it last saw, so workers agree on the calendar and share
+# one sync token instead of each polling the API.
+
+
+class CalendarSnapshot:
+    """
+    What a replica reads back from the store for one calendar.
+    Attributes:
+        generation: Bumped whenever the calendar is cleared; a replica on an
+            older generation must drop everything before applying `changes`.
+        version: Version of the newest change included.
+        changes: (event_id, event) pairs; event is None for a deletion.
+        windows: Merged (lo, hi) ranges fully fetched into the store.
+        sync_token: Latest Calendar API nextSyncToken, or None.
+        synced_at: Wall-clock time of the last sync with the API.
+    """
+
+    def __init__(self, generation: int, version: int, changes: list, windows: list, sync_token: Optional[str], synced_at: float):
+        self.generation = generation
+        self.version = version
+        self.changes = changes
+        self.windows = windows
+        self.sync_token = sync_token
+        self.synced_at = synced_at
+
+
+def merge_windows(windows: list, lo: float, hi: float) -> list:
+    """
+    Adds [lo, hi) to a sorted list of disjoint ranges, merging overlaps.
+    """
+    merged = []
+    for w_lo, w_hi in sorted(list(windows) + [(lo, hi)]):
+        if merged and w_lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], w_hi))
+        else:
+            merged.append((w_lo, w_hi))
+    return merged
+
+
+class CalendarStore(ABC):
+    """
+    Interface for shared calendar stores. Implementations must be safe to use
+    from several threads and several processes at once.
+    """
+
+    @abstractmethod
+    def read(self, calendar_id: str, generation: int, version: int) -> Optional[CalendarSnapshot]:
+        """
+        Returns the changes after `version`, or every live event when the
+        stored generation differs from `generation`. None if the calendar
+        has never been written.
+        """
+
+    @abstractmethod
+    def write(self, calendar_id: str, changes: Optional[dict] = None, clear: bool = False, reset_windows: bool = False, window: Optional[tuple] = None, sync_token: Optional[str] = None, synced_at: Optional[float] = None) -> None:
+        """
+        Applies one batch of changes atomically.
+        Args:
+            calendar_id: Calendar to update.
+            changes: event_id -> event, or None to delete it.
+            clear: Drop all events, windows and the sync token first.
+            reset_windows: Forget which time ranges are fully fetched.
+            window: A (lo, hi) range now fully fetched.
+            sync_token: New sync token.
+            synced_at: Wall-clock time of a completed sync.
+        """
+
+
+class SQLiteCalendarStore(CalendarStore):
+    """
+    Calendar store in a local SQLite database in WAL mode, so workers on the
+    same host read concurrently while one of them writes.
+    """
+
+    def __init__(self, path: str = "calendar_cache.db", busy_timeout: float = 30):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calendars ("
+            " calendar_id TEXT PRIMARY KEY,"
+            " generation INTEGER NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " windows TEXT NOT NULL,"
+            " sync_token TEXT,"
+            " synced_at REAL NOT NULL)"
+        )
+        # A NULL event is a tombstone, so replicas behind it still see the delete.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calendar_events ("
+            " calendar_id TEXT NOT NULL,"
+            " event_id TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " event TEXT,"
+            " PRIMARY KEY (calendar_id, event_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS calendar_events_version ON calendar_events (calendar_id, version)")
+
+    def read(self, calendar_id: str, generation: int, version: int) -> Optional[CalendarSnapshot]:
+        with self._lock:
+            # One read transaction, so the rows match the calendar row's version.
+            self._conn.execute("BEGIN")
+            try:
+                meta = self._conn.execute(
+                    "SELECT generation, version, windows, sync_token, synced_at FROM calendars WHERE calendar_id = ?",
+                    (calendar_id,),
+                ).fetchone()
+                if meta is None:
+                    return None
+                if meta[0] != generation:
+                    rows = self._conn.execute(
+                        "SELECT event_id, event FROM calendar_events WHERE calendar_id = ? AND event IS NOT NULL",
+                        (calendar_id,),
+                    ).fetchall()
+                elif meta[1] > version:
+                    rows = self._conn.execute(
+                        "SELECT event_id, event FROM calendar_events WHERE calendar_id = ? AND version > ?",
+                        (calendar_id, version),
+                    ).fetchall()
+                else:
+                    rows = []
+            finally:
+                self._conn.execute("COMMIT")
+        changes = [(event_id, json.loads(event) if event is not None else None) for event_id, event in rows]
+        windows = [tuple(w) for w in json.loads(meta[2])]
+        return CalendarSnapshot(meta[0], meta[1], changes, windows, meta[3], meta[4])
+
+    def write(self, calendar_id: str, changes: Optional[dict] = None, clear: bool = False, reset_windows: bool = False, window: Optional[tuple] = None, sync_token: Optional[str] = None, synced_at: Optional[float] = None) -> None:
+        rows = [(event_id, json.dumps(event) if event is not None else None) for event_id, event in (changes or {}).items()]
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so read-modify-write of
+            # the calendar row can't interleave with another worker's.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._conn.execute(
+                    "SELECT generation, version, windows, sync_token, synced_at FROM calendars WHERE calendar_id = ?",
+                    (calendar_id,),
+                ).fetchone()
+                generation, version, windows, token, last_synced = meta if meta else (0, 0, "[]", None, 0.0)
+                windows = [tuple(w) for w in json.loads(windows)]
+                if clear:
+                    self._conn.execute("DELETE FROM calendar_events WHERE calendar_id = ?", (calendar_id,))
+                    generation, windows, token, last_synced = generation + 1, [], None, 0.0
+                version += 1
+                self._conn.executemany(
+                    "INSERT INTO calendar_events (calendar_id, event_id, version, event) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(calendar_id, event_id) DO UPDATE SET version = excluded.version, event = excluded.event",
+                    [(calendar_id, event_id, version, event) for event_id, event in rows],
+                )
+                if reset_windows:
+                    windows = []
+                if window is not None:
+                    windows = merge_windows(windows, *window)
+                if sync_token is not None:
+                    token = sync_token
+                if synced_at is not None:
+                    last_synced = max(last_synced, synced_at)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO calendars (calendar_id, generation, version, windows, sync_token, synced_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (calendar_id, generation, version, json.dumps(windows), token, last_synced),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+
+def create_calendar_store(backend: Optional[str] = None) -> Optional[CalendarStore]:
+    """
+    Builds the store selected by the CALENDAR_CACHE_STORE env var.
+    Args:
+        backend: "memory" or "sqlite". Overrides CALENDAR_CACHE_STORE, which
+            defaults to "sqlite" so all workers share one cache (see
+            create_session_store); "memory" is for a single process only.
+    Returns:
+        A CalendarStore, or None for a process-local cache.
+    """
+    backend = (backend or os.getenv("CALENDAR_CACHE_STORE", "sqlite")).lower()
+    if backend == "sqlite":
+        return SQLiteCalendarStore(path=os.getenv("CALENDAR_CACHE_DB_PATH", "calendar_cache.db"))
+    if backend == "memory":
+        return None
+    raise ValueError(f"Unknown CALENDAR_CACHE_STORE backend: {backend}")
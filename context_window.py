@@ -0,0 +1,157 @@
+import json
+import os
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import fast_json
+from event_index import event_time
+
+
+# --- Context-window management ---
+# Keeps the prompt sent to Gemini under a token budget. Old tool results are
+# compacted to short digests first; if that isn't enough, the oldest turns are
+# folded into a running plain-text summary.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+# After crossing the budget, compact down to this fraction of it so compaction
+# (which forces a transcript rebuild) happens once in a while, not every turn.
+CONTEXT_TARGET_RATIO = float(os.getenv("CONTEXT_TARGET_RATIO", "0.6"))
+CONTEXT_SUMMARY_MAX_CHARS = int(os.getenv("CONTEXT_SUMMARY_MAX_CHARS", "4000"))
+
+CHARS_PER_TOKEN = 4
+DIGEST_MAX_EVENTS = 20
+SUMMARY_LINE_CHARS = 200
+
+
+def estimate_tokens(msg) -> int:
+    """
+    Rough token count of one message (about 4 characters per token).
+    """
+    size = len(str(msg.content))
+    if isinstance(msg, AIMessage) and msg.tool_calls:
+        size += sum(len(tc["name"]) + len(json.dumps(dict(tc["args"]), default=str)) for tc in msg.tool_calls)
+    return size // CHARS_PER_TOKEN + 1
+
+
+def digest_tool_result(content: str) -> tuple:
+    """
+    Shrinks a tool result to what later turns actually need.
+    Args:
+        content: The ToolMessage content (a JSON string).
+    Returns:
+        (digest JSON string, whether anything was dropped)
+    """
+    try:
+        result = fast_json.loads(content)
+    except (TypeError, ValueError):
+        return content, False
+    if not isinstance(result, dict) or result.get("compacted"):
+        return content, False
+    if isinstance(result.get("events"), list):
+        events = result["events"]
+        digest = {
+            "compacted": True,
+            "event_count": result.get("total", len(events)),
+            "events": [
+                {
+                    "id": e.get("id"),
+                    "summary": e.get("summary", ""),
+                    "start": event_time(e.get("start")),
+                    "end": event_time(e.get("end")),
+                }
+                for e in events[:DIGEST_MAX_EVENTS]
+            ],
+        }
+        return fast_json.dumps(digest), True
+    if len(content) > 1000:
+        return fast_json.dumps({"compacted": True, "status": result.get("status"), "preview": content[:500]}), True
+    return content, False
+
+
+def _clip(text: str) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= SUMMARY_LINE_CHARS else text[:SUMMARY_LINE_CHARS - 3] + "..."
+
+
+def summarize_messages(messages: list) -> list:
+    """
+    One short summary line per message, keeping ids that later turns may refer to.
+    """
+    lines = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage):
+            lines.append(f"User: {_clip(msg.content)}")
+        elif isinstance(msg, AIMessage) and msg.tool_calls:
+            calls = ", ".join(f"{tc['name']}({json.dumps(dict(tc['args']), default=str)})" for tc in msg.tool_calls)
+            lines.append(_clip(f"Assistant called {calls}"))
+        elif isinstance(msg, AIMessage):
+            lines.append(f"Assistant: {_clip(msg.content)}")
+        elif isinstance(msg, ToolMessage):
+            try:
+                result = fast_json.loads(msg.content)
+            except (TypeError, ValueError):
+                result = {}
+            if isinstance(result, dict) and isinstance(result.get("events"), list):
+                events = "; ".join(
+                    f"{e.get('id')} '{e.get('summary', '')}' {event_time(e.get('start'))}"
+                    for e in result["events"][:10]
+                )
+                count = result.get("event_count", result.get("total", len(result["events"])))
+                lines.append(_clip(f"{msg.name} returned {count} events: {events}"))
+            else:
+                lines.append(f"{msg.name} returned: {_clip(msg.content)}")
+    return lines
+
+
+def _turn_starts(messages: list) -> list:
+    return [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+
+
+def compact_context(messages: list, summary: str = "", budget: int = None) -> dict:
+    """
+    Brings a conversation back under the token budget.
+    Args:
+        messages: The session's LangChain messages; the last turn is never touched.
+        summary: The running summary of turns dropped earlier.
+        budget: Token budget, defaults to CONTEXT_TOKEN_BUDGET.
+    Returns:
+        {} when the conversation already fits, otherwise {"messages", "summary"}
+        with old tool results digested and, if needed, old turns summarized.
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    sizes = [estimate_tokens(m) for m in messages]
+    summary_tokens = len(summary) // CHARS_PER_TOKEN
+    if summary_tokens + sum(sizes) <= budget:
+        return {}
+
+    target = int(budget * CONTEXT_TARGET_RATIO)
+    starts = _turn_starts(messages)
+    current_turn = starts[-1] if starts else len(messages)
+
+    # 1. Digest tool results from previous turns.
+    messages = list(messages)
+    for i in range(current_turn):
+        msg = messages[i]
+        if isinstance(msg, ToolMessage):
+            content, changed = digest_tool_result(msg.content)
+            if changed:
+                messages[i] = ToolMessage(name=msg.name, content=content, tool_call_id=msg.tool_call_id)
+                sizes[i] = estimate_tokens(messages[i])
+
+    # 2. Fold whole turns, oldest first, into the summary.
+    cut = 0
+    total = summary_tokens + sum(sizes)
+    for start in starts[1:]:
+        if total <= target or start > current_turn:
+            break
+        total -= sum(sizes[cut:start])
+        cut = start
+    if cut:
+        lines = ([summary] if summary else []) + summarize_messages(messages[:cut])
+        summary = "\n".join(lines)
+        if len(summary) > CONTEXT_SUMMARY_MAX_CHARS:
+            # Keep the most recent part of the summary, starting on a whole line.
+            summary = summary[-CONTEXT_SUMMARY_MAX_CHARS:].split("\n", 1)[-1]
+        messages = messages[cut:]
+
+    return {"messages": messages, "summary": summary}
@@ -0,0 +1,274 @@
+import math
+import re
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Optional
+
+
+# --- In-memory event index ---
+# Answers get_calendar_events filters without scanning every event:
+#   * time range: events sorted by start, searched with bisect
+#   * summary keyword: inverted index from summary tokens to event ids
+#   * attendee: lowercased email -> event ids
+# plus the interval helpers behind find_free_slots and check_conflicts.
+
+# Events longer than this are kept out of the sorted-start list and checked
+# separately, so a range query only has to look back this far from its start.
+LONG_EVENT_SECONDS = 24 * 3600
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    RFC3339 datetime or YYYY-MM-DD date to a UTC timestamp. Naive values are taken as UTC.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def event_bounds(event: dict) -> tuple:
+    """
+    (start, end) timestamps of an event; all-day events span whole UTC days.
+    """
+    start = event.get("start", {})
+    end = event.get("end", {})
+    lo = parse_time(start.get("dateTime") or start.get("date"))
+    hi = parse_time(end.get("dateTime") or end.get("date"))
+    if lo is None:
+        lo = -math.inf
+    if hi is None:
+        hi = lo
+    return lo, hi
+
+
+def format_time(timestamp: float) -> str:
+    """
+    UTC timestamp to an RFC3339 datetime ("2025-07-03T09:00:00Z").
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def event_time(value) -> str:
+    """
+    The datetime (or all-day date) of an event's start/end, given either the
+    API's {"dateTime"|"date": ...} dict or a slim event's string.
+    """
+    if isinstance(value, str):
+        return value
+    return (value or {}).get("dateTime") or (value or {}).get("date") or ""
+
+
+def slim_event(event: dict) -> dict:
+    """
+    What the model needs of an event: id, summary, start and end as strings,
+    and location and attendee emails when set.
+    """
+    slim = {
+        "id": event.get("id"),
+        "summary": event.get("summary", ""),
+        "start": event_time(event.get("start")),
+        "end": event_time(event.get("end")),
+    }
+    if event.get("location"):
+        slim["location"] = event["location"]
+    attendees = [a["email"] for a in event.get("attendees", []) if a.get("email")]
+    if attendees:
+        slim["attendees"] = attendees
+    return slim
+
+
+def is_busy(event: dict) -> bool:
+    """
+    Whether an event blocks its time: not cancelled and not marked "free".
+    """
+    return event.get("status") != "cancelled" and event.get("transparency") != "transparent"
+
+
+def merge_intervals(intervals) -> list:
+    """
+    Sorts (start, end) intervals and merges overlapping or touching ones, in O(n log n).
+    """
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1]:
+            if hi > merged[-1][1]:
+                merged[-1][1] = hi
+        else:
+            merged.append([lo, hi])
+    return [tuple(interval) for interval in merged]
+
+
+def free_gaps(busy: list, lo: float, hi: float, min_duration: float = 0) -> list:
+    """
+    (start, end) gaps in [lo, hi) of at least min_duration seconds.
+    Args:
+        busy: Merged busy intervals, as returned by merge_intervals.
+        lo: Range start timestamp.
+        hi: Range end timestamp.
+        min_duration: Shortest gap worth returning.
+    """
+    gaps = []
+    cursor = lo
+    for b_lo, b_hi in busy:
+        if b_hi <= cursor:
+            continue
+        if b_lo >= hi:
+            break
+        if b_lo - cursor >= min_duration and b_lo > cursor:
+            gaps.append((cursor, b_lo))
+        cursor = max(cursor, b_hi)
+    if hi - cursor >= min_duration and hi > cursor:
+        gaps.append((cursor, hi))
+    return gaps
+
+
+def tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class EventIndex:
+    """
+    Event store with time-range, summary-keyword and attendee lookups.
+    Not thread-safe; callers serialize access.
+    """
+
+    def __init__(self):
+        self.events = {}  # event id -> event
+        self.bounds = {}  # event id -> (start, end)
+        self._summaries = {}  # event id -> lowercased summary
+        self._attendees = {}  # event id -> lowercased attendee emails
+        self._by_start = []  # sorted (start, event id) for short events
+        self._long = set()  # ids of events longer than LONG_EVENT_SECONDS
+        self._tokens = {}  # summary token -> event ids
+        self._by_attendee = {}  # lowercased email -> event ids
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def put(self, event: dict) -> None:
+        """
+        Adds or replaces an event.
+        """
+        event_id = event["id"]
+        if event_id in self.events:
+            self.pop(event_id)
+        lo, hi = event_bounds(event)
+        summary = (event.get("summary") or "").lower()
+        attendees = {a["email"].lower() for a in event.get("attendees", []) if a.get("email")}
+        self.events[event_id] = event
+        self.bounds[event_id] = (lo, hi)
+        self._summaries[event_id] = summary
+        self._attendees[event_id] = attendees
+        if hi - lo > LONG_EVENT_SECONDS:
+            self._long.add(event_id)
+        else:
+            insort(self._by_start, (lo, event_id))
+        for token in set(tokenize(summary)):
+            self._tokens.setdefault(token, set()).add(event_id)
+        for email in attendees:
+            self._by_attendee.setdefault(email, set()).add(event_id)
+
+    def pop(self, event_id: str) -> Optional[dict]:
+        """
+        Removes an event, returning it (or None if it wasn't indexed).
+        """
+        event = self.events.pop(event_id, None)
+        if event is None:
+            return None
+        lo, _ = self.bounds.pop(event_id)
+        if event_id in self._long:
+            self._long.discard(event_id)
+        else:
+            i = bisect_left(self._by_start, (lo, event_id))
+            if i < len(self._by_start) and self._by_start[i] == (lo, event_id):
+                del self._by_start[i]
+        for token in set(tokenize(self._summaries.pop(event_id))):
+            ids = self._tokens[token]
+            ids.discard(event_id)
+            if not ids:
+                del self._tokens[token]
+        for email in self._attendees.pop(event_id):
+            ids = self._by_attendee[email]
+            ids.discard(event_id)
+            if not ids:
+                del self._by_attendee[email]
+        return event
+
+    def clear(self) -> None:
+        self.events.clear()
+        self.bounds.clear()
+        self._summaries.clear()
+        self._attendees.clear()
+        self._by_start.clear()
+        self._long.clear()
+        self._tokens.clear()
+        self._by_attendee.clear()
+
+    def items(self):
+        return self.events.items()
+
+    def _in_range(self, lo: float, hi: float) -> set:
+        start = -math.inf if lo == -math.inf else lo - LONG_EVENT_SECONDS
+        i = bisect_left(self._by_start, (start,))
+        j = bisect_left(self._by_start, (hi,))
+        bounds = self.bounds
+        ids = {eid for _, eid in self._by_start[i:j] if bounds[eid][1] > lo}
+        ids.update(eid for eid in self._long if bounds[eid][1] > lo and bounds[eid][0] < hi)
+        return ids
+
+    def _with_keyword(self, keyword: str) -> Optional[set]:
+        """
+        Candidate ids for a summary substring match, or None if the keyword
+        has no word characters to look up.
+        """
+        tokens = tokenize(keyword)
+        if not tokens:
+            return None
+        candidates = None
+        for token in tokens:
+            # A keyword token may be part of a longer summary token ("meet" in "meeting").
+            ids = set()
+            for indexed, postings in self._tokens.items():
+                if token in indexed:
+                    ids |= postings
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return candidates
+
+    def search(self, lo: float = -math.inf, hi: float = math.inf, summary_keyword: Optional[str] = None, attendee_email: Optional[str] = None) -> list:
+        """
+        Events overlapping [lo, hi) that match the optional filters, ordered by start.
+        Args:
+            lo: Range start timestamp (events must end after it).
+            hi: Range end timestamp (events must start before it).
+            summary_keyword: Case-insensitive substring of the summary.
+            attendee_email: Case-insensitive attendee email.
+        Returns:
+            List of event dicts.
+        """
+        # Start from the most selective structure, then verify the rest per event.
+        keyword = summary_keyword.lower() if summary_keyword else None
+        bounded = (lo, hi) != (-math.inf, math.inf)
+        bounds = self.bounds
+        candidates = None
+        if attendee_email:
+            candidates = self._by_attendee.get(attendee_email.lower(), set())
+        elif bounded:
+            candidates = self._in_range(lo, hi)
+            bounded = False  # already checked
+        elif keyword:
+            candidates = self._with_keyword(keyword)
+        if candidates is None:
+            candidates = self.events.keys()
+        if bounded:
+            candidates = [eid for eid in candidates if bounds[eid][1] > lo and bounds[eid][0] < hi]
+        if keyword:
+            summaries = self._summaries
+            candidates = [eid for eid in candidates if keyword in summaries[eid]]
+        return [self.events[eid] for eid in sorted(candidates, key=lambda eid: (bounds[eid][0], eid))]
@@ -0,0 +1,32 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+# --- JSON for tool results ---
+# Tool results are serialized on every tool call and parsed again whenever a
+# transcript is (re)built, so they use orjson when it is installed and the
+# standard library otherwise. Both produce compact output (no spaces), which
+# is also what gets sent to Gemini.
+
+
+def dumps(obj) -> str:
+    """
+    Compact JSON text for obj.
+    """
+    if orjson is not None:
+        # orjson produces bytes; ToolMessage content must be text, so decode once here.
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def loads(data):
+    """
+    Parses JSON text or bytes.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
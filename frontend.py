@@ -1,6 +1,11 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import datetime # Import datetime for current time/date
+import html
+import json
+import re
+import uuid
 from dotenv import load_dotenv
 import os
 # --- Configuration and Constants ---
@@ -15,9 +20,13 @@ load_dotenv("keys.env")
 
 # API endpoint (still using mock for now)
 API_URL = os.getenv("API_URL")  # Default to local server if not set
+# Server-Sent Events variant of the chat endpoint
+STREAM_API_URL = os.getenv("STREAM_API_URL") or (f"{API_URL.rstrip('/')}/stream" if API_URL else None)
+# Only the latest messages are drawn on each rerun; older ones are one click away.
+CHAT_HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "40"))
 
 # --- Custom CSS for Enhanced Aesthetics ---
-st.markdown("""
+CUSTOM_CSS = """
 <style>
 /* General Body & Typography */
 html, body, [data-testid="stAppViewContainer"] {
@@ -77,7 +86,6 @@ h1 {
     text-align: left;
     margin-right: auto;
     border-bottom-left-radius: 5px; /* Unique shape */
-    animation: slideInLeft 0.4s ease-out forwards; /* Entry animation */
     transform-origin: left center;
 }
 
@@ -87,10 +95,34 @@ h1 {
     text-align: right;
     margin-left: auto;
     border-bottom-right-radius: 5px; /* Unique shape */
-    animation: slideInRight 0.4s ease-out forwards; /* Entry animation */
     transform-origin: right center;
 }
 
+/* History rows: the whole window is one pre-rendered HTML block */
+.chat-row {
+    display: flex;
+    align-items: flex-end;
+    gap: 8px;
+    margin-bottom: 10px;
+}
+.chat-row.user-row {
+    flex-direction: row-reverse;
+}
+.chat-avatar {
+    font-size: 1.4em;
+    line-height: 1;
+}
+
+/* Only the newest bubbles animate in, not the whole history on every rerun */
+.chat-row:last-child .bot-bubble,
+.st-chat-message-assistant .bot-bubble {
+    animation: slideInLeft 0.4s ease-out forwards; /* Entry animation */
+}
+.chat-row:nth-last-child(2) .user-bubble,
+.st-chat-message-user .user-bubble {
+    animation: slideInRight 0.4s ease-out forwards; /* Entry animation */
+}
+
 /* Avatar Styling (optional, if you want custom ones) */
 .st-chat-message-user > div[data-testid="stImage"] img,
 .st-chat-message-assistant > div[data-testid="stImage"] img {
@@ -156,12 +188,33 @@ h1 {
 }
 
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+@st.cache_data
+def minified_css(css: str) -> str:
+    """
+    The stylesheet without comments and indentation, computed once per process
+    and re-sent as a small element on every rerun.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    return re.sub(r"\s*\n\s*", "", css)
+
+
+st.markdown(minified_css(CUSTOM_CSS), unsafe_allow_html=True)
 
 # --- Session State Initialization ---
 if "chat_messages" not in st.session_state:
     st.session_state.chat_messages = []
 
+# Each browser session gets its own backend conversation
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# How many of the latest messages are drawn
+if "history_window" not in st.session_state:
+    st.session_state.history_window = CHAT_HISTORY_WINDOW
+
 # Initialize current time and date in session state
 if "current_time" not in st.session_state:
     st.session_state.current_time = datetime.datetime.now()
@@ -169,52 +222,114 @@ if "current_date" not in st.session_state:
     st.session_state.current_date = datetime.date.today()
 
 
-def get_bot_response(user_message: str) -> str:
+@st.cache_resource
+def http_session() -> requests.Session:
+    """
+    One pooled HTTP session per server process, shared by all browser
+    sessions, so every message reuses a kept-alive connection to the backend
+    instead of opening a new one.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def bubble_html(sender: str, message: str) -> str:
     """
-    Sends the user message to the FastAPI Gemini backend and returns the reply.
+    A message's chat row as HTML, rendered once when the message is added.
+    The text is escaped, so replies show exactly what the backend sent.
     """
+    text = html.escape(message).replace("\n", "<br>")
+    if sender == "user":
+        return f"<div class='chat-row user-row'><span class='chat-avatar'>🧑</span><div class='chat-bubble user-bubble'>{text}</div></div>"
+    return f"<div class='chat-row bot-row'><span class='chat-avatar'>🤖</span><div class='chat-bubble bot-bubble'>{text}</div></div>"
+
+
+def add_message(sender: str, message: str) -> None:
+    st.session_state.chat_messages.append((sender, message, bubble_html(sender, message)))
+
+
+def get_bot_response(user_message: str, status=None):
+    """
+    Sends the user message to the FastAPI Gemini backend and yields the reply
+    text as it streams in, so it can be rendered with st.write_stream.
+    Tool activity is shown in the optional `status` placeholder.
+    """
+    streamed = False
     try:
-        response = requests.post(API_URL, json={"text": user_message}, timeout=15)
-        response.raise_for_status()
-        return response.json().get("reply", "No reply received from AI.")
+        # (connect timeout, read timeout between events) - long tool chains are fine
+        # as long as the backend keeps sending events.
+        with http_session().post(
+            STREAM_API_URL,
+            json={"text": user_message, "session_id": st.session_state.session_id},
+            stream=True,
+            timeout=(5, 60),
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if event["type"] == "token":
+                    streamed = True
+                    yield event["text"]
+                elif event["type"] == "tool_start" and status is not None:
+                    status.caption(f"Running {event['name']}...")
+                elif event["type"] == "tool_end" and status is not None:
+                    status.empty()
+                elif event["type"] == "done" and not streamed:
+                    yield event.get("reply") or "No reply received from AI."
+                elif event["type"] == "error":
+                    yield f"Server error: {event['message']}"
     except requests.exceptions.Timeout:
-        return "The AI took too long to respond. Please try again."
+        yield "The AI took too long to respond. Please try again."
     except requests.exceptions.ConnectionError:
-        return "Could not connect to the AI server. Is it running?"
+        yield "Could not connect to the AI server. Is it running?"
     except requests.exceptions.HTTPError as e:
-        return f"Server error: {e}"
+        yield f"Server error: {e}"
     except Exception as e:
-        return f"Unexpected error: {e}"
+        yield f"Unexpected error: {e}"
+    finally:
+        if status is not None:
+            status.empty()
 # --- UI Layout ---
 st.title("Calen AI Assistant")
 
 chat_placeholder = st.container()
 
-# Display chat messages using Streamlit's native chat elements
+# Display the latest messages as a single element built from each message's
+# pre-rendered HTML, so a rerun costs the same however long the chat gets.
 with chat_placeholder:
-    for sender, message in st.session_state.chat_messages:
-        if sender == "user":
-            with st.chat_message("user", avatar="🧑"):
-                # Using custom HTML for the bubble to apply specific CSS
-                st.markdown(f"<div class='chat-bubble user-bubble'>{message}</div>", unsafe_allow_html=True)
-        else:
-            with st.chat_message("assistant", avatar="🤖"):
-                # Using custom HTML for the bubble
-                st.markdown(f"<div class='chat-bubble bot-bubble'>{message}</div>", unsafe_allow_html=True)
+    messages = st.session_state.chat_messages
+    hidden = len(messages) - st.session_state.history_window
+    if hidden > 0:
+        # A fixed label keeps the button's identity stable as the count changes.
+        st.caption(f"{hidden} earlier messages hidden")
+        if st.button("Show earlier messages", key="show_earlier"):
+            st.session_state.history_window += CHAT_HISTORY_WINDOW
+            st.rerun()
+    window = messages[max(hidden, 0):]
+    if window:
+        st.markdown("".join(rendered for _, _, rendered in window), unsafe_allow_html=True)
 
 # User input at the bottom
 user_input = st.chat_input("Type your message here...", key="chat_input")
 
 if user_input:
     # Add user message to history
-    st.session_state.chat_messages.append(("user", user_input))
-
-    # Show a spinner while waiting for response
-    with st.spinner("Processing..."):
-        bot_reply = get_bot_response(user_input)
+    add_message("user", user_input)
 
-    # Add bot message to history
-    st.session_state.chat_messages.append(("bot", bot_reply))
+    # Render the reply token by token while it streams in
+    with chat_placeholder:
+        with st.chat_message("user", avatar="🧑"):
+            st.markdown(bubble_html("user", user_input), unsafe_allow_html=True)
+        with st.chat_message("assistant", avatar="🤖"):
+            status = st.empty()
+            bot_reply = st.write_stream(get_bot_response(user_input, status))
 
-    st.rerun() 
+    # Add bot message to history. No st.rerun(): this turn is already on
+    # screen, and the next interaction draws it from the history window.
+    add_message("bot", bot_reply) 
 
@@ -0,0 +1,292 @@
+import copy
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+from google.auth.transport.requests import Request
+from google.generativeai import GenerativeModel, configure
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest, build_http
+
+from tool_registry import registry
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# --- Lazily initialized Google clients ---
+# Nothing here runs at import time: credentials, the Calendar service and the
+# Gemini model are created on first use (or by warm_up() from the FastAPI
+# lifespan), once per process, behind a lock.
+#
+# The Calendar client's httplib2 transport is not thread-safe, and tools run
+# on a thread pool. The service object is shared, but every request it builds
+# is sent over the calling thread's own AuthorizedHttp, which keeps its
+# connections alive between that thread's requests. All of them share one
+# Credentials object, refreshed once (under _lock and the token file lock) for
+# every thread and worker.
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+TOKEN_PATH = os.getenv("GOOGLE_TOKEN_PATH", "token.json")
+CLIENT_SECRETS_PATH = os.getenv("GOOGLE_CLIENT_SECRETS_PATH", "credentials.json")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Refresh the access token this many seconds before it expires.
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_creds = None
+_calendar_service = None
+_gemini_model = None
+_thread_local = threading.local()
+
+
+class CredentialsUnavailable(RuntimeError):
+    pass
+
+
+def _interactive_allowed() -> bool:
+    # The browser flow would hang a headless server, so it only runs when asked
+    # for or when someone is at the terminal.
+    flag = os.getenv("OAUTH_INTERACTIVE")
+    if flag is not None:
+        return flag == "1"
+    return sys.stdin is not None and sys.stdin.isatty()
+
+
+@contextmanager
+def _token_file_lock():
+    """
+    Exclusive lock on token.json.lock, held while reading, refreshing and
+    writing the token so several worker processes never refresh (and
+    overwrite each other's token.json) at the same time.
+    """
+    with open(f"{TOKEN_PATH}.lock", "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after ~10s; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _save_credentials(creds: Credentials) -> None:
+    # Write to a temp file and rename, so a crash never leaves half a token.json.
+    # Caller holds _token_file_lock().
+    tmp_path = f"{TOKEN_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as token:
+        token.write(creds.to_json())
+    os.replace(tmp_path, TOKEN_PATH)
+
+
+def _read_token_file() -> Optional[Credentials]:
+    # The file token.json stores the user's access and refresh tokens, and is
+    # created automatically when the authorization flow completes for the first
+    # time.
+    if os.path.exists(TOKEN_PATH):
+        return Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
+    return None
+
+
+def _refreshed(creds: Optional[Credentials]) -> Credentials:
+    """
+    Returns credentials that are good for at least TOKEN_REFRESH_MARGIN more
+    seconds: the ones in token.json if another worker already refreshed them,
+    otherwise `creds` refreshed here and written back.
+    """
+    with _token_file_lock():
+        on_disk = _read_token_file()
+        if on_disk and on_disk.valid and _seconds_until_refresh(on_disk) > 0:
+            return on_disk
+        creds = creds or on_disk
+        creds.refresh(Request())
+        _save_credentials(creds)
+        return creds
+
+
+def _load_credentials() -> Credentials:
+    creds = _read_token_file()
+    if creds and creds.valid:
+        return creds
+    if creds and creds.expired and creds.refresh_token:
+        return _refreshed(creds)
+    elif _interactive_allowed():
+        flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_PATH, SCOPES)
+        creds = flow.run_local_server(port=0)
+    else:
+        raise CredentialsUnavailable(
+            f"No valid Google credentials in {TOKEN_PATH}. Run `python google_clients.py` "
+            "once in a terminal to authorize, or set OAUTH_INTERACTIVE=1."
+        )
+    with _token_file_lock():
+        _save_credentials(creds)
+    return creds
+
+
+def get_credentials() -> Credentials:
+    """
+    Returns the process-wide Google credentials, loading them on first use and
+    refreshing them if they have expired.
+    """
+    global _creds
+    with _lock:
+        if _creds is None:
+            _creds = _load_credentials()
+        elif not _creds.valid:
+            _adopt(_refreshed(_creds))
+        return _creds
+
+
+def _thread_http() -> AuthorizedHttp:
+    """
+    This thread's authorized transport for Calendar requests, created on the
+    thread's first request and reused (with its open connections) after that.
+    """
+    creds = _creds
+    if creds is None or not creds.valid:
+        creds = get_credentials()  # loads, or refreshes the shared token if it has expired
+    http = getattr(_thread_local, "http", None)
+    if http is None or http.credentials is not creds:
+        http = _thread_local.http = AuthorizedHttp(creds, http=build_http())
+    return http
+
+
+def _build_request(http, *args, **kwargs) -> HttpRequest:
+    # requestBuilder for the Calendar service: ignore the service's own http
+    # and send each request over the calling thread's.
+    return HttpRequest(_thread_http(), *args, **kwargs)
+
+
+def calendar_service():
+    """
+    Returns the Calendar v3 service, built on first use from the discovery
+    document bundled with google-api-python-client (no discovery request).
+    It is safe to share between threads: see _thread_http.
+    """
+    global _calendar_service
+    if _calendar_service is not None:
+        return _calendar_service
+    with _lock:
+        if _calendar_service is None:
+            _calendar_service = build(
+                "calendar", "v3", credentials=get_credentials(),
+                requestBuilder=_build_request,
+                static_discovery=True, cache_discovery=False,
+            )
+        return _calendar_service
+
+
+def set_calendar_service(service) -> None:
+    """
+    Replaces the Calendar service, e.g. with a stub in benchmarks.
+    """
+    global _calendar_service
+    with _lock:
+        _calendar_service = service
+
+
+def gemini_model() -> GenerativeModel:
+    """
+    Returns the shared Gemini model, built on first use with the cached
+    declarations of every registered tool. All calls go through its one
+    client (a gRPC channel, so requests are multiplexed over HTTP/2).
+    """
+    global _gemini_model
+    if _gemini_model is not None:
+        return _gemini_model
+    with _lock:
+        if _gemini_model is None:
+            configure(api_key=os.getenv("GEMIN_KEY"))
+            _gemini_model = GenerativeModel(GEMINI_MODEL_NAME, tools=[registry.gemini_tool()])
+        return _gemini_model
+
+
+def set_gemini_model(model) -> None:
+    """
+    Replaces the Gemini model, e.g. with a stub in benchmarks.
+    """
+    global _gemini_model
+    with _lock:
+        _gemini_model = model
+
+
+def _seconds_until_refresh(creds: Credentials) -> float:
+    if creds.expiry is None:
+        return 600
+    expiry = creds.expiry.replace(tzinfo=timezone.utc)
+    return max(0.0, (expiry - datetime.now(timezone.utc)).total_seconds() - TOKEN_REFRESH_MARGIN)
+
+
+def _adopt(creds: Credentials) -> None:
+    # Update the shared credentials in place: the Calendar service (and its
+    # authorized http) holds on to this object.
+    # Caller holds _lock.
+    if creds is not _creds:
+        _creds.token = creds.token
+        _creds.expiry = creds.expiry
+        if creds.refresh_token:
+            _creds._refresh_token = creds.refresh_token
+
+
+def refresh_credentials() -> float:
+    """
+    Background job (see scheduler.py): refreshes the access token once it is
+    within TOKEN_REFRESH_MARGIN of expiring, so no request ever waits on it.
+    Returns:
+        Seconds until the next refresh is due.
+    """
+    with _lock:
+        creds = _creds
+    if creds is None or not creds.refresh_token:
+        return 60  # not loaded yet (warm-up or the first request will)
+    if _seconds_until_refresh(creds) > 0:
+        return _seconds_until_refresh(creds)
+    # Refresh a copy without holding _lock: requests keep using the current
+    # (still valid) token meanwhile, and only the swap waits for them.
+    fresh = _refreshed(copy.copy(creds))
+    with _lock:
+        _adopt(fresh)
+    return _seconds_until_refresh(fresh)
+
+
+def warm_up() -> None:
+    """
+    Creates the clients ahead of the first request. Failures are reported but
+    not raised; the request path retries lazily.
+    """
+    try:
+        gemini_model()
+        calendar_service()
+    except Exception as e:
+        logger.warning("Google client warm-up failed: %s", e)
+
+
+if __name__ == "__main__":
+    # One-off interactive authorization that writes token.json for the server.
+    os.environ["OAUTH_INTERACTIVE"] = "1"
+    get_credentials()
+    print(f"Saved credentials to {TOKEN_PATH}")
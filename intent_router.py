@@ -0,0 +1,153 @@
+import os
+import re
+from datetime import datetime
+from typing import Callable, Optional
+
+from event_index import event_time
+
+
+# --- Fast-path intent router ---
+# A few requests are so common and so simple that a model round-trip is pure
+# overhead: "what time is it?" costs one Gemini call to decide to call
+# get_current_datetime and a second one to phrase its result. Messages that
+# match one of the rules below are answered by running the tool directly and
+# filling in a template; everything else goes to Gemini as before.
+#
+# Rules must match the whole message, so "what time is it in Tokyo?" or
+# "what's on today and tomorrow?" still reach the model.
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER", "1") != "0"
+# Routed event listings beyond this many lines end with "...and N more".
+ROUTER_MAX_LISTED_EVENTS = 20
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s'@-]+")
+_LEADING_FILLER_RE = re.compile(
+    r"^(?:(?:hey|hi|hello|ok|okay|so|please|pls|quick question)\s+)*"
+    r"(?:(?:can|could|would) you\s+)?(?:please\s+)?(?:tell me\s+|let me know\s+)?"
+)
+_TRAILING_FILLER_RE = re.compile(r"(?:\s+(?:please|pls|thanks|thank you))+$")
+
+_WHAT = r"(?:what|what's|whats|what is)"
+_EVENTS = r"(?:events|meetings|appointments|plans)"
+_PLAN = r"(?:calendar|schedule|agenda)"
+_TODAY = r"(?:today|for today)"
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercases a message and strips punctuation, greetings and "please"s.
+    """
+    text = _PUNCTUATION_RE.sub(" ", text.lower().replace("’", "'"))
+    text = " ".join(text.split())
+    text = _LEADING_FILLER_RE.sub("", text)
+    return _TRAILING_FILLER_RE.sub("", text)
+
+
+def _datetime_args(now: datetime) -> dict:
+    return {}
+
+
+def _today_args(now: datetime) -> dict:
+    today = now.strftime("%Y-%m-%d")
+    return {"start_date": today, "end_date": today}
+
+
+_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+
+def _render_datetime(result: dict) -> Optional[str]:
+    match = _DATETIME_RE.search(result.get("message", ""))
+    if result.get("status") == "error" or match is None:
+        return None
+    now = datetime.strptime(match.group(), "%Y-%m-%d %H:%M:%S")
+    return f"It's {now:%H:%M} on {now:%A, %B} {now.day}, {now.year}."
+
+
+def _event_line(event: dict) -> str:
+    start, end = event_time(event.get("start")), event_time(event.get("end"))
+    summary = event.get("summary") or "(no title)"
+    if "T" not in start:
+        return f"- All day: {summary}"
+    times = datetime.fromisoformat(start.replace("Z", "+00:00")).strftime("%H:%M")
+    if "T" in end:
+        times += "-" + datetime.fromisoformat(end.replace("Z", "+00:00")).strftime("%H:%M")
+    return f"- {times} {summary}"
+
+
+def _render_events(result: dict) -> Optional[str]:
+    events = result.get("events")
+    if result.get("status") == "error" or not isinstance(events, list):
+        return None
+    # The tool returns at most a page of events; `total` counts all of them.
+    total = result.get("total", len(events))
+    if not total:
+        return "You have no events today."
+    events = sorted(events, key=lambda e: event_time(e.get("start")))
+    lines = [_event_line(e) for e in events[:ROUTER_MAX_LISTED_EVENTS]]
+    if total > len(lines):
+        lines.append(f"...and {total - len(lines)} more.")
+    noun = "event" if total == 1 else "events"
+    return f"You have {total} {noun} today:\n" + "\n".join(lines)
+
+
+class Intent:
+    """
+    A trivial request answered by one tool call and a template.
+    Args:
+        name: Label for metrics.
+        patterns: Regexes that must match the whole normalized message.
+        tool: Name of the registered tool to call.
+        make_args: Builds the tool arguments from the current time.
+        render: Turns the tool's parsed JSON result into the reply, or None
+            when it can't (e.g. the tool failed), leaving the message to Gemini.
+    """
+
+    def __init__(self, name: str, patterns: list, tool: str, make_args: Callable[[datetime], dict], render: Callable[[dict], Optional[str]]):
+        self.name = name
+        self.patterns = [re.compile(p) for p in patterns]
+        self.tool = tool
+        self.make_args = make_args
+        self.render = render
+
+    def matches(self, normalized: str) -> bool:
+        return any(p.fullmatch(normalized) for p in self.patterns)
+
+
+INTENTS = [
+    Intent(
+        "current_datetime",
+        [
+            rf"{_WHAT} (?:the )?(?:current )?(?:time|date|day|date and time|time and date)(?: is it)?(?: (?:now|right now|today))?",
+            r"what time is it(?: now| right now)?",
+            r"(?:what|which) (?:day|date) is (?:it|today)(?: today)?",
+            rf"{_WHAT} (?:today's|todays) date",
+            r"(?:the )?(?:current|today's|todays) (?:time|date|date and time)",
+        ],
+        "get_current_datetime", _datetime_args, _render_datetime,
+    ),
+    Intent(
+        "today_events",
+        [
+            rf"{_WHAT} on (?:my )?(?:{_PLAN} )?{_TODAY}",
+            rf"{_WHAT} (?:on )?my {_PLAN} (?:look like )?{_TODAY}",
+            rf"{_WHAT} does (?:my )?(?:{_PLAN} |day )?(?:look like )?today",
+            rf"(?:list|show|show me|get|give me) (?:all )?(?:of )?(?:my )?(?:today's|todays) (?:{_EVENTS}|{_PLAN})",
+            rf"(?:list|show|show me|get|give me) (?:all )?(?:of )?(?:my )?(?:{_EVENTS}|{_PLAN}) {_TODAY}",
+            rf"(?:what|which) {_EVENTS} (?:do i have|have i got|are there|are on my {_PLAN})(?: on my {_PLAN})? {_TODAY}",
+            rf"(?:do i have|have i got|are there) any {_EVENTS} today",
+            r"what do i have (?:on |going on |planned )?today",
+        ],
+        "get_calendar_events", _today_args, _render_events,
+    ),
+]
+
+
+def classify(text: str) -> Optional[Intent]:
+    """
+    The intent a message is a trivial instance of, or None when it needs the model.
+    """
+    normalized = normalize(text)
+    for intent in INTENTS:
+        if intent.matches(normalized):
+            return intent
+    return None
@@ -0,0 +1,273 @@
+import asyncio
+import bisect
+import functools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+
+# --- Metrics and timing spans ---
+# A small in-process implementation of Prometheus counters, gauges and
+# histograms, rendered in the text exposition format by GET /metrics.
+# Values are per process: with several workers, scrape each one (or put them
+# behind per-worker ports) and aggregate in Prometheus.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+logger = logging.getLogger(__name__)
+
+# Name of the tool whose code is running, so Calendar API calls are labelled
+# with the tool that made them ("none" outside tools, e.g. background sync).
+current_tool = ContextVar("current_tool", default="none")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Base for metrics. Counters and gauges may instead be computed at scrape
+    time by `function`: a callable returning {label values tuple: value}, or
+    a number when there are no labels.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), function: Optional[Callable] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> list:
+        # (suffix, label names, label values, extra label, value)
+        if self.function is not None:
+            values = self.function()
+            if not isinstance(values, dict):
+                values = {(): values}
+            return [("", self.labelnames, key, "", value) for key, value in values.items()]
+        with self._lock:
+            return [("", self.labelnames, key, "", value) for key, value in self._values.items()]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def total(self, **labels) -> float:
+        """
+        Sum over every series whose labels include the given ones.
+        """
+        wanted = [(self.labelnames.index(n), str(v)) for n, v in labels.items()]
+        with self._lock:
+            return sum(v for key, v in self._values.items() if all(key[i] == value for i, value in wanted))
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]  # bucket counts, count, sum
+            if i < len(self.buckets):
+                entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def mean(self, **labels) -> float:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] / entry[1] if entry else 0.0
+
+    def _samples(self) -> list:
+        samples = []
+        with self._lock:
+            entries = [(key, list(counts), count, total) for key, (counts, count, total) in self._values.items()]
+        for key, counts, count, total in entries:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                samples.append(("_bucket", self.labelnames, key, f'le="{_format_value(float(bound))}"', cumulative))
+            samples.append(("_bucket", self.labelnames, key, 'le="+Inf"', count))
+            samples.append(("_count", self.labelnames, key, "", count))
+            samples.append(("_sum", self.labelnames, key, "", total))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = (), function: Optional[Callable] = None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = (), function: Optional[Callable] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+node_duration = registry.histogram("graph_node_duration_seconds", "Time spent in each LangGraph node.", ("node",))
+graph_iterations = registry.histogram(
+    "graph_iterations", "Gemini calls (graph loop iterations) per chat request.", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+request_duration = registry.histogram("chat_request_duration_seconds", "End-to-end chat request time.", ("endpoint",))
+gemini_tokens = registry.counter("gemini_tokens_total", "Gemini tokens, by prompt or response.", ("kind",))
+gemini_retries = registry.counter("gemini_retries_total", "Gemini calls retried after a retryable error.", ("error",))
+calendar_calls = registry.counter("calendar_api_calls_total", "Calendar API requests, by tool and method.", ("tool", "method", "status"))
+calendar_duration = registry.histogram("calendar_api_duration_seconds", "Calendar API request latency, by tool.", ("tool", "method"))
+transcript_syncs = registry.counter(
+    "gemini_transcript_syncs_total", "Transcript syncs served incrementally (hit) or rebuilt (miss).", ("result",)
+)
+budget_exhausted = registry.counter(
+    "turn_budget_exhausted_total", "Turns ended with a partial answer, by the budget that ran out.", ("reason",)
+)
+job_runs = registry.counter("background_job_runs_total", "Background job runs, by job and outcome.", ("job", "status"))
+job_duration = registry.histogram("background_job_duration_seconds", "Background job run time.", ("job",))
+router_requests = registry.counter(
+    "intent_router_requests_total", "User messages answered by the intent router (hit) or passed to Gemini (miss).", ("intent", "result")
+)
+router_hit_ratio = registry.gauge(
+    "intent_router_hit_ratio", "Share of user messages answered by the intent router.",
+    function=lambda: router_requests.total(result="hit") / max(router_requests.total(), 1),
+)
+# Each routed answer skips two Gemini calls (pick the tool, phrase its result);
+# they are costed at the mean call_gemini duration seen so far.
+router_saved_seconds = registry.counter(
+    "intent_router_saved_seconds_total", "Estimated latency saved by routed answers over the Gemini path."
+)
+
+
+@contextmanager
+def span(name: str, histogram: Optional[Histogram] = None, **labels):
+    """
+    Times a block: observes its duration in `histogram` (with `labels`) and
+    logs it at DEBUG as a structured line.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
+        if logger.isEnabledFor(logging.DEBUG):
+            fields = " ".join(f"{k}={v}" for k, v in labels.items())
+            logger.debug("span=%s duration_ms=%.1f %s", name, elapsed * 1000, fields)
+
+
+def execute(request, method: str):
+    """
+    request.execute() for a Calendar API request (or batch), counted and
+    timed under the running tool.
+    """
+    tool = current_tool.get()
+    status = "error"
+    try:
+        with span("calendar_api", calendar_duration, tool=tool, method=method):
+            response = request.execute()
+        status = "ok"
+        return response
+    finally:
+        calendar_calls.inc(tool=tool, method=method, status=status)
+
+
+def timed_node(node: str):
+    """
+    Decorator recording a LangGraph node function's (sync or async) duration
+    in graph_node_duration_seconds.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(node, node_duration, node=node):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(node, node_duration, node=node):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
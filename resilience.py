@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+import metrics
+
+
+# --- Resilience for calls to Gemini ---
+# Every model call goes through a ResilientCaller, which:
+#   * retries retryable errors (429, 5xx, timeouts) with exponential backoff
+#     and full jitter, so clients hit by the same outage don't retry in step;
+#   * never retries or waits past the request's deadline;
+#   * fails fast while a circuit breaker is open after repeated failures
+#     (server errors and timeouts; 429s mean "slow down", not "down", and are
+#     left to backoff and the concurrency limit);
+#   * caps how many calls are in flight, so a rate-limit storm isn't fed by
+#     ever more concurrent requests.
+
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "4"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+GEMINI_RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# The breaker opens when at least this fraction of the last GEMINI_BREAKER_WINDOW
+# attempts failed (and at least GEMINI_BREAKER_MIN_CALLS were made).
+GEMINI_BREAKER_FAILURE_RATIO = float(os.getenv("GEMINI_BREAKER_FAILURE_RATIO", "0.5"))
+GEMINI_BREAKER_WINDOW = int(os.getenv("GEMINI_BREAKER_WINDOW", "20"))
+GEMINI_BREAKER_MIN_CALLS = int(os.getenv("GEMINI_BREAKER_MIN_CALLS", "10"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+# Wall-clock budget for all Gemini calls (and retries) of one chat request.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+_RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.Unknown,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a dependency whose circuit breaker is open.
+    """
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when a request's deadline passes before a call could complete.
+    """
+
+
+_RATE_LIMIT_ERRORS = (api_exceptions.TooManyRequests, api_exceptions.ResourceExhausted)
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, _RETRYABLE_ERRORS)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    "Full jitter" exponential backoff: a random delay in [0, min(cap, base * 2**attempt)].
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def new_deadline(seconds: float = None) -> float:
+    """
+    A time.monotonic() deadline `seconds` from now (REQUEST_DEADLINE_SECONDS by default).
+    """
+    return time.monotonic() + (REQUEST_DEADLINE_SECONDS if seconds is None else seconds)
+
+
+class CircuitBreaker:
+    """
+    Opens when the failure ratio over the last `window` attempts reaches
+    `failure_ratio` and rejects calls for `reset_seconds`; then lets a single
+    trial call through (half-open), which closes the circuit on success or
+    reopens it on failure. A ratio rather than a run of consecutive failures,
+    so scattered 429s under concurrent load (which retries absorb) don't trip it.
+    """
+
+    def __init__(self, failure_ratio: float = GEMINI_BREAKER_FAILURE_RATIO, window: int = GEMINI_BREAKER_WINDOW, min_calls: int = GEMINI_BREAKER_MIN_CALLS, reset_seconds: float = GEMINI_BREAKER_RESET_SECONDS):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.reset_seconds = reset_seconds
+        self.outcomes = deque(maxlen=window)  # True for a failed attempt
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def _check(self) -> bool:
+        # Caller holds _lock. Returns whether the call would be the half-open trial.
+        if self.opened_at is None:
+            return False
+        remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+        if remaining > 0 or self._trial_in_flight:
+            raise CircuitOpenError(f"circuit open, retry in {max(remaining, 0):.0f}s")
+        return True
+
+    def check(self) -> None:
+        """
+        Like before_call, but doesn't claim the half-open trial: a cheap early
+        check before waiting for a concurrency slot.
+        Raises:
+            CircuitOpenError: if the call must not be attempted now.
+        """
+        with self._lock:
+            self._check()
+
+    def before_call(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: if the call must not be attempted now.
+        """
+        with self._lock:
+            if self._check():
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._trial_in_flight:
+                self.outcomes.clear()
+            self.outcomes.append(False)
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.outcomes.append(True)
+            failures = sum(self.outcomes)
+            tripped = len(self.outcomes) >= self.min_calls and failures >= self.failure_ratio * len(self.outcomes)
+            if self._trial_in_flight or tripped:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_ignored(self) -> None:
+        # The call ended without telling us anything about the dependency's
+        # health (e.g. a bad request); let another trial through.
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class ResilientCaller:
+    """
+    Retry, deadline, circuit-breaker and concurrency-limit policy for one
+    dependency. The wrapped function gets the seconds left until the deadline
+    as `timeout`, to use as its own request timeout.
+    """
+
+    def __init__(self, max_attempts: int = GEMINI_MAX_ATTEMPTS, base_delay: float = GEMINI_RETRY_BASE_DELAY, max_delay: float = GEMINI_RETRY_MAX_DELAY, max_concurrency: int = GEMINI_MAX_CONCURRENCY, breaker: Optional[CircuitBreaker] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        # asyncio semaphores belong to one event loop, so keep one per loop.
+        self._async_semaphores = weakref.WeakKeyDictionary()
+
+    def _async_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _remaining(self, deadline: float) -> float:
+        """
+        Seconds left until the deadline. Called before every attempt.
+        Raises:
+            DeadlineExceededError: if there are none.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self.breaker.record_ignored()
+            raise DeadlineExceededError("request deadline exceeded")
+        return remaining
+
+    def _after_failure(self, error: Exception, attempt: int, deadline: float, retryable: Callable[[Exception], bool]) -> float:
+        """
+        Records a failed attempt and returns how long to wait before the next
+        one, or re-raises when there shouldn't be one.
+        """
+        if not is_retryable(error):
+            self.breaker.record_ignored()
+            raise error
+        if isinstance(error, _RATE_LIMIT_ERRORS):
+            self.breaker.record_ignored()
+        else:
+            self.breaker.record_failure()
+        if not retryable(error) or attempt + 1 >= self.max_attempts:
+            raise error
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+        if time.monotonic() + delay >= deadline:
+            raise error
+        logger.warning("Retrying after %s: %s (attempt %d, waiting %.2fs)", type(error).__name__, error, attempt + 1, delay)
+        metrics.gemini_retries.inc(error=type(error).__name__)
+        return delay
+
+    def call(self, func: Callable, deadline: Optional[float] = None, retryable: Callable[[Exception], bool] = is_retryable):
+        """
+        Calls func(timeout=...) with retries, blocking the calling thread.
+        Args:
+            func: The call to make; gets the seconds left as `timeout`.
+            deadline: time.monotonic() deadline, defaults to REQUEST_DEADLINE_SECONDS from now.
+            retryable: Extra condition for retrying a retryable error.
+        Raises:
+            CircuitOpenError, DeadlineExceededError, or func's last error.
+        """
+        deadline = deadline or new_deadline()
+        attempt = 0
+        while True:
+            self.breaker.check()
+            if not self._semaphore.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise DeadlineExceededError("request deadline exceeded waiting for a free slot")
+            try:
+                # Again now that a slot is free: the circuit may have opened while this call queued.
+                self.breaker.before_call()
+                timeout = self._remaining(deadline)
+            except (CircuitOpenError, DeadlineExceededError):
+                self._semaphore.release()
+                raise
+            try:
+                result = func(timeout=timeout)
+            except Exception as e:
+                delay = self._after_failure(e, attempt, deadline, retryable)
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._semaphore.release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, func: Callable[..., Awaitable], deadline: Optional[float] = None, retryable: Callable[[Exception], bool] = is_retryable):
+        """
+        Async version of call: func(timeout=...) returns an awaitable, and
+        waiting (for a slot or a retry) doesn't block the event loop.
+        """
+        deadline = deadline or new_deadline()
+        semaphore = self._async_semaphore()
+        attempt = 0
+        while True:
+            self.breaker.check()
+            try:
+                await asyncio.wait_for(semaphore.acquire(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError("request deadline exceeded waiting for a free slot") from None
+            try:
+                # Again now that a slot is free: the circuit may have opened while this call queued.
+                self.breaker.before_call()
+                timeout = self._remaining(deadline)
+            except (CircuitOpenError, DeadlineExceededError):
+                semaphore.release()
+                raise
+            try:
+                result = await func(timeout=timeout)
+            except Exception as e:
+                delay = self._after_failure(e, attempt, deadline, retryable)
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                semaphore.release()
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+
+# --- Response cache for repeated read-only questions ---
+# "What's on today?" asked twice in a day gets the same answer as long as the
+# calendar hasn't changed. A finished turn is cached when every tool it called
+# is cacheable (read-only, see tool_registry); a later identical question is
+# answered by replaying that turn's messages, with no Gemini or Calendar call.
+#
+# Keys are the normalized question plus today's date, so "today"/"tomorrow"
+# resolve to the day they were asked, plus a fingerprint of the assistant's
+# previous reply: a follow-up like "yes please" or "friday" only means the same
+# thing after the same offer or question. Entries remember the calendar cache
+# version they were built on and are dropped once it moves (an add/delete
+# tool, or changes picked up by a sync), as well as after a TTL and by LRU.
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))  # 0 disables the cache
+
+_WORD_RE = re.compile(r"[a-z0-9@.:'-]+")
+# Filler that doesn't change what is being asked.
+_FILLER = {
+    "please", "pls", "hey", "hi", "hello", "can", "could", "would", "you", "tell", "show", "me", "give",
+    "i", "want", "to", "know", "kindly", "thanks", "thank",
+}
+_SYNONYMS = {
+    "what's": "what", "whats": "what", "meetings": "events", "meeting": "events", "appointments": "events",
+    "appointment": "events", "event": "events", "schedule": "calendar", "agenda": "calendar",
+    "i've": "i", "do": "", "have": "", "got": "",
+}
+# Words that make a question depend on earlier turns ("and the day after?",
+# "move it"), which a cached answer from another conversation can't know.
+_CONTEXT_WORDS = {
+    "it", "its", "that", "those", "these", "them", "they", "this", "there", "he", "she", "him", "her",
+    "and", "also", "then", "again", "same", "after", "before", "previous", "last", "other", "else", "more",
+}
+
+
+def normalize_query(text: str) -> Optional[str]:
+    """
+    Canonical form of a question for cache lookups, or None when it depends
+    on the conversation so far and must not be answered from the cache.
+    """
+    words = []
+    for word in _WORD_RE.findall(text.lower()):
+        word = word.strip(".:'-")
+        word = _SYNONYMS.get(word, word)
+        if not word or word in _FILLER:
+            continue
+        if word in _CONTEXT_WORDS:
+            return None
+        words.append(word)
+    return " ".join(words) or None
+
+
+def conversation_context(messages: list) -> str:
+    """
+    Fingerprint of the assistant's last reply before the latest question, or
+    "" at the start of a conversation.
+    """
+    asked = False
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            asked = True
+        elif asked and isinstance(msg, AIMessage) and not msg.tool_calls:
+            return hashlib.sha1(str(msg.content).encode()).hexdigest()[:16]
+    return ""
+
+
+def turn_messages(messages: list) -> list:
+    """
+    Messages after the last HumanMessage: the assistant's side of the latest turn.
+    """
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i + 1:]
+    return []
+
+
+class _Entry:
+    def __init__(self, messages: list, calendar_version: int, expires_at: float):
+        self.messages = messages
+        self.calendar_version = calendar_version
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU + TTL cache of finished read-only turns.
+    Args:
+        registry: Tool registry, to tell which tools are cacheable.
+        calendar_version: Returns the current calendar cache version.
+        max_entries: LRU bound.
+        ttl_seconds: Entry lifetime; 0 disables caching.
+    """
+
+    def __init__(self, registry, calendar_version, max_entries: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL):
+        self.registry = registry
+        self.calendar_version = calendar_version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, date: str, context: str = "") -> Optional[tuple]:
+        query = normalize_query(text)
+        return (query, date, context) if query else None
+
+    def get(self, text: str, date: str, context: str = "") -> Optional[list]:
+        """
+        Copies of the cached turn's messages for this question, or None.
+        Args:
+            context: conversation_context() of the session's messages.
+        """
+        if self.ttl_seconds <= 0:
+            return None
+        key = self.key(text, date, context)
+        if key is None:
+            return None
+        now = time.monotonic()
+        # Outside the lock: with a shared calendar store this reads it, to see
+        # changes made by other workers.
+        calendar_version = self.calendar_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.expires_at <= now or entry.calendar_version != calendar_version):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [msg.model_copy() for msg in entry.messages]
+
+    def _cacheable(self, messages: list) -> bool:
+        if not messages or not isinstance(messages[-1], AIMessage) or messages[-1].tool_calls:
+            return False
+        tool_calls = [tc for msg in messages if isinstance(msg, AIMessage) for tc in msg.tool_calls]
+        if not tool_calls:
+            # Nothing was looked up, so the answer may rest on earlier turns.
+            return False
+        for tc in tool_calls:
+            registered = self.registry.get(tc["name"])
+            if registered is None or not registered.cacheable:
+                return False
+        for msg in messages:
+            if isinstance(msg, ToolMessage):
+                try:
+                    if json.loads(msg.content).get("status") == "error":
+                        return False
+                except (TypeError, ValueError, AttributeError):
+                    return False
+        return True
+
+    def put(self, text: str, date: str, messages: list, calendar_version: int, context: str = "") -> bool:
+        """
+        Caches a finished turn if it qualifies.
+        Args:
+            text: The user's question.
+            date: Today's date (YYYY-MM-DD).
+            messages: The turn's messages after the question (see turn_messages).
+            calendar_version: Calendar cache version read before the turn ran,
+                so changes made while it ran make the entry stale.
+            context: conversation_context() of the session's messages.
+        Returns:
+            Whether the turn was cached.
+        """
+        if self.ttl_seconds <= 0:
+            return False
+        key = self.key(text, date, context)
+        if key is None or not self._cacheable(messages):
+            return False
+        entry = _Entry(list(messages), calendar_version, time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Optional
+
+import metrics
+from metrics import span
+
+
+# --- Background jobs ---
+# Work that must not sit on a user's request path (token refresh, calendar
+# prefetch) runs as periodic jobs on the FastAPI event loop, started and
+# stopped by the app's lifespan. Job functions are blocking and run in a
+# worker thread; a failing job is logged and retried with backoff, never
+# stopping the others.
+
+BACKGROUND_JOBS_ENABLED = os.getenv("BACKGROUND_JOBS", "1") != "0"
+JOB_MAX_BACKOFF = float(os.getenv("JOB_MAX_BACKOFF", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    Args:
+        name: Label for logs and metrics.
+        func: Blocking callable. It may return the seconds until its next run;
+            otherwise (None) the job runs again after `interval`.
+        interval: Seconds between runs.
+        initial_delay: Seconds before the first run.
+    """
+
+    def __init__(self, name: str, func: Callable[[], Optional[float]], interval: float, initial_delay: float = 0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.initial_delay = initial_delay
+
+
+class BackgroundScheduler:
+    def __init__(self):
+        self.jobs = []
+        self._tasks = []
+
+    def add_job(self, name: str, func: Callable[[], Optional[float]], interval: float, initial_delay: float = 0) -> Job:
+        job = Job(name, func, interval, initial_delay)
+        self.jobs.append(job)
+        return job
+
+    async def _run(self, job: Job) -> None:
+        delay = job.initial_delay
+        failures = 0
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                with span("job", metrics.job_duration, job=job.name):
+                    next_delay = await asyncio.to_thread(job.func)
+            except Exception as e:
+                failures += 1
+                delay = min(job.interval * 2 ** failures, max(JOB_MAX_BACKOFF, job.interval))
+                logger.warning("Background job %s failed (%d in a row), next try in %.0fs: %s", job.name, failures, delay, e)
+                metrics.job_runs.inc(job=job.name, status="error")
+                continue
+            failures = 0
+            delay = job.interval if next_delay is None else max(next_delay, 1.0)
+            metrics.job_runs.inc(job=job.name, status="ok")
+
+    def start(self) -> None:
+        """
+        Starts every job on the running event loop.
+        """
+        self._tasks = [asyncio.create_task(self._run(job), name=f"job-{job.name}") for job in self.jobs]
+
+    async def stop(self) -> None:
+        # A job thread already running finishes on its own; its result is dropped.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.messages import HumanMessage, messages_from_dict, messages_to_dict
+
+
+# --- Session-keyed conversation storage ---
+# Each chat session owns its own ChatState, so one user's history never leaks
+# into (or slows down) another user's Gemini calls.
+
+
+def new_session_state() -> dict:
+    """
+    Returns an empty ChatState for a brand new session.
+    """
+    return {"messages": [], "summary": "", "context_epoch": 0}
+
+
+def trim_messages(messages: list, max_messages: int) -> list:
+    """
+    Drops the oldest turns so a session never holds more than max_messages.
+    Args:
+        messages: The session's LangChain messages, oldest first.
+        max_messages: Upper bound on the number of messages to keep.
+    Returns:
+        The trimmed list. Trimming always restarts on a HumanMessage so a
+        tool call is never separated from its tool result.
+    """
+    if max_messages <= 0 or len(messages) <= max_messages:
+        return messages
+    start = len(messages) - max_messages
+    while start < len(messages) and not isinstance(messages[start], HumanMessage):
+        start += 1
+    return messages[start:]
+
+
+class SessionStore(ABC):
+    """
+    Interface for conversation stores. Implementations must be thread-safe.
+    """
+
+    @abstractmethod
+    def load(self, session_id: str) -> dict:
+        """
+        Returns the stored ChatState for session_id, or a fresh one.
+        """
+
+    @abstractmethod
+    def save(self, session_id: str, state: dict) -> None:
+        """
+        Persists the ChatState for session_id.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """
+        Forgets session_id.
+        """
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local store with LRU eviction by session count and TTL eviction
+    by idle time.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600, max_messages: int = 200):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._sessions = OrderedDict()  # session_id -> (last_used, state)
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float) -> None:
+        # OrderedDict is kept in last-used order, so expired sessions are at the front.
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if now - last_used < self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+
+    def load(self, session_id: str) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return new_session_state()
+            self._sessions.move_to_end(session_id)
+            # Hand out a shallow copy so a failed graph run can't half-update the store.
+            state = dict(entry[1])
+            state["messages"] = list(state["messages"])
+            return state
+
+    def save(self, session_id: str, state: dict) -> None:
+        now = time.monotonic()
+        state = dict(state)
+        state["messages"] = trim_messages(list(state["messages"]), self.max_messages)
+        with self._lock:
+            self._sessions[session_id] = (now, state)
+            self._sessions.move_to_end(session_id)
+            self._evict_expired(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Local SQLite-backed store so sessions survive a backend restart and are
+    shared by every worker on the host (the database runs in WAL mode, so
+    readers don't block the writer). Messages are serialized with LangChain's
+    messages_to_dict.
+    """
+
+    def __init__(self, path: str = "sessions.db", max_sessions: int = 10000, ttl_seconds: float = 7 * 24 * 3600, max_messages: int = 200, busy_timeout: float = 30):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._saves_since_evict = 0
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _dumps(state: dict) -> str:
+        payload = {k: v for k, v in state.items() if k != "messages"}
+        payload["messages"] = messages_to_dict(state["messages"])
+        return json.dumps(payload)
+
+    @staticmethod
+    def _loads(raw: str) -> dict:
+        payload = json.loads(raw)
+        payload["messages"] = messages_from_dict(payload["messages"])
+        return payload
+
+    def load(self, session_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] >= self.ttl_seconds:
+            return new_session_state()
+        return self._loads(row[0])
+
+    def save(self, session_id: str, state: dict) -> None:
+        state = dict(state)
+        state["messages"] = trim_messages(list(state["messages"]), self.max_messages)
+        raw = self._dumps(state)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                (session_id, raw, time.time()),
+            )
+            self._saves_since_evict += 1
+            if self._saves_since_evict >= 100:
+                self._evict()
+                self._saves_since_evict = 0
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        # Caller holds self._lock.
+        self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            " SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+
+def create_session_store(backend: Optional[str] = None) -> SessionStore:
+    """
+    Builds the session store selected by the SESSION_STORE env var.
+    Args:
+        backend: "memory" or "sqlite". Overrides SESSION_STORE, which defaults
+            to "sqlite" so any worker can serve any session. (Worker count
+            can't be told from here: `uvicorn --workers N` doesn't set
+            WEB_CONCURRENCY.) "memory" is for a single process only.
+    Returns:
+        A SessionStore instance.
+    """
+    backend = (backend or os.getenv("SESSION_STORE", "sqlite")).lower()
+    max_messages = int(os.getenv("SESSION_MAX_MESSAGES", "200"))
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+            max_sessions=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600))),
+            max_messages=max_messages,
+        )
+    if backend == "memory":
+        return InMemorySessionStore(
+            max_sessions=int(os.getenv("SESSION_MAX_COUNT", "1000")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600")),
+            max_messages=max_messages,
+        )
+    raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
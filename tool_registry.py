@@ -0,0 +1,118 @@
+import inspect
+import json
+from collections.abc import Mapping
+from typing import Callable, Optional
+
+import pydantic
+from google.generativeai import protos
+from google.generativeai.types import content_types
+
+
+# --- Tool registry ---
+# Functions decorated with @registry.register are exposed to Gemini. The
+# function declaration and an argument validator are derived once, at
+# registration, instead of on every model call; dispatch is a dict lookup.
+
+
+def to_plain(value):
+    """
+    Converts proto map/repeated values (as found in Gemini function call args)
+    to plain dicts and lists.
+    """
+    if isinstance(value, Mapping):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, (str, bytes)):
+        return value
+    if hasattr(value, "__iter__") and not isinstance(value, (dict, set)):
+        return [to_plain(v) for v in value]
+    return value
+
+
+class RegisteredTool:
+    """
+    A tool function with its cached Gemini declaration and argument model.
+    `cacheable` marks read-only tools whose result only changes when the
+    calendar does, so answers built on them may be reused (see response_cache).
+    """
+
+    def __init__(self, func: Callable, name: Optional[str] = None, cacheable: bool = False):
+        self.func = func
+        self.name = name or func.__name__
+        self.cacheable = cacheable
+        self.declaration = content_types.FunctionDeclaration.from_function(func).to_proto()
+        self.declaration.name = self.name
+        fields = {}
+        for param in inspect.signature(func).parameters.values():
+            annotation = param.annotation if param.annotation is not inspect.Parameter.empty else object
+            default = param.default if param.default is not inspect.Parameter.empty else ...
+            fields[param.name] = (annotation, default)
+        self.args_model = pydantic.create_model(
+            f"{self.name}_args", __config__=pydantic.ConfigDict(extra="forbid"), **fields
+        )
+
+    def validate(self, args) -> dict:
+        """
+        Validates and coerces raw call arguments.
+        Raises:
+            pydantic.ValidationError: if the arguments don't match the signature.
+        """
+        parsed = self.args_model.model_validate(to_plain(args or {}))
+        return {name: getattr(parsed, name) for name in self.args_model.model_fields}
+
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools = {}
+        self._gemini_tool = None
+
+    def register(self, func: Optional[Callable] = None, *, name: Optional[str] = None, cacheable: bool = False):
+        """
+        Decorator registering a tool function; usable as @register or
+        @register(name=..., cacheable=...). The function itself is returned unchanged.
+        """
+        def decorator(f: Callable) -> Callable:
+            registered = RegisteredTool(f, name, cacheable)
+            if registered.name in self._tools:
+                raise ValueError(f"Tool {registered.name} is already registered")
+            self._tools[registered.name] = registered
+            self._gemini_tool = None
+            return f
+        return decorator(func) if func is not None else decorator
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(self._tools.values())
+
+    def get(self, name: str) -> Optional[RegisteredTool]:
+        return self._tools.get(name)
+
+    def gemini_tool(self) -> protos.Tool:
+        """
+        All declarations as one protos.Tool, built once and reused for every model.
+        """
+        if self._gemini_tool is None:
+            self._gemini_tool = protos.Tool(function_declarations=[t.declaration for t in self._tools.values()])
+        return self._gemini_tool
+
+    def dispatch(self, name: str, args) -> str:
+        """
+        Runs a tool by name.
+        Returns:
+            The tool's JSON string result, or a JSON error for unknown tools and
+            invalid arguments (the tool itself is not called in that case).
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            return json.dumps({"status": "error", "message": f"Unknown tool: {name}"})
+        try:
+            kwargs = tool.validate(args)
+        except pydantic.ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'args'}: {err['msg']}" for err in e.errors())
+            return json.dumps({"status": "error", "message": f"Invalid arguments for {name}: {errors}"})
+        return tool.func(**kwargs)
+
+
+registry = ToolRegistry()
+tool = registry.register